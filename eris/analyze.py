@@ -21,10 +21,34 @@ from __future__ import print_function
 from __future__ import division
 
 import argparse
+import numpy as np
 import pandas as pd
 from container import Container, Contention
-from eris import remove_finished_containers, detect_contender
+from eris import remove_finished_containers, build_contender_index,\
+    detect_contender, add_fleet_row, detect_fleet
 from analyze.analyzer import Analyzer
+from analyze.columnar import read_frame
+from analyze.detection import FleetDetector
+
+
+def replay_batches(mdf):
+    """
+    Split metrics data into per timestamp batches with one stable sort,
+    batches are yielded in order of first appearance of each timestamp
+        mdf - metrics DataFrame
+    """
+    codes, times = pd.factorize(mdf['time'])
+    order = np.argsort(codes, kind='mergesort')
+    codes = codes[order]
+    columns = list(mdf.columns)
+    arrays = [mdf[col].values[order] for col in columns]
+    bounds = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    start = 0
+    for end in list(bounds) + [len(codes)]:
+        rows = [dict(zip(columns, values)) for values in
+                zip(*(array[start:end] for array in arrays))]
+        yield times[codes[start]], rows
+        start = end
 
 
 def process_offline_data(args, analyzer):
@@ -33,36 +57,41 @@ def process_offline_data(args, analyzer):
         args - arguments from command line input
     """
     metric_cons = dict()
+    fleet = FleetDetector()
 
-    mdf = pd.read_csv(args.metric_file)
+    mdf = read_frame(args.metric_file)
     key = 'cid' if args.key_cid else 'name'
-    times = mdf['time'].unique()
-    for time in times:
-        pdata = mdf[mdf['time'] == time]
-        cids = pdata[key].unique()
-        remove_finished_containers(cids, metric_cons)
-        for cid in cids:
-            jdata = pdata[pdata[key] == cid]
-            thresh = analyzer.get_thresh(cid)
-            tdp_thresh = analyzer.get_tdp_thresh(cid)
-            if cid in metric_cons:
-                con = metric_cons[cid]
-            else:
-                con = Container('cgroupfs', '', cid, [], args.verbose, thresh,
-                                tdp_thresh)
-                metric_cons[cid] = con
-            for row_tuple in jdata.iterrows():
-                con.update_metrics(row_tuple)
-
-        for cid in cids:
-            con = metric_cons[cid]
-            contend_res = con.contention_detect()
-            tdp_contend = con.tdp_contention_detect()
-            if tdp_contend:
-                contend_res.append(tdp_contend)
+    for _, rows in replay_batches(mdf):
+        cids = []
+        cidset = set()
+        for row in rows:
+            cid = row[key]
+            if cid not in metric_cons:
+                thresh = analyzer.get_thresh_table(cid)
+                tdp_thresh = analyzer.get_tdp_thresh(cid)
+                # key is also container id, so the contended container is
+                # never reported as its own contender
+                metric_cons[cid] = Container('cgroupfs', cid, cid, [],
+                                             args.verbose, thresh, tdp_thresh)
+            if cid not in cidset:
+                cidset.add(cid)
+                cids.append(cid)
+        remove_finished_containers(cidset, metric_cons)
+        for row in rows:
+            metric_cons[row[key]].update_metrics(row)
+
+        fleet.reset()
+        cons = [metric_cons[cid] for cid in cids]
+        for con in cons:
+            add_fleet_row(fleet, con)
+        index = None
+        for con, contend_res in zip(cons, detect_fleet(fleet, cons)):
             for contend in contend_res:
                 if contend != Contention.UNKN:
-                    detect_contender(metric_cons, contend, con)
+                    if index is None:
+                        index = build_contender_index(metric_cons)
+                    detect_contender(metric_cons, index, contend, con,
+                                     args.suspects)
 
 
 def process(args):
@@ -76,7 +105,10 @@ def process(args):
     else:
         strict = True if args.fense_type == 'gmm-strict' else False
         analyzer.build_model(args.util_file, args.metric_file,
-                             args.thresh, strict, args.verbose)
+                             args.thresh, strict, args.verbose, args.jobs,
+                             args.bic_patience, args.warm_start,
+                             args.chunk_rows, args.sample_cap,
+                             args.incremental)
 
 
 def main():
@@ -103,8 +135,30 @@ def main():
     parser.add_argument('-u', '--util-file', help='Utilization file collected\
                         from eris agent', type=argparse.FileType('rt'),
                         default=Analyzer.UTIL_FILE)
+    parser.add_argument('-j', '--jobs', help='number of processes used to\
+                        build model in parallel', type=int, default=1)
+    parser.add_argument('-b', '--bic-patience', help='stop searching GMM\
+                        components once BIC is not improved for given number\
+                        of consecutive component counts', type=int,
+                        default=None)
+    parser.add_argument('-w', '--warm-start', help='initialize each GMM fit\
+                        from parameters of previous fit', action='store_true')
+    parser.add_argument('-c', '--chunk-rows', help='read csv metrics file in\
+                        chunks of given rows and build model one workload at\
+                        a time to bound memory usage', type=int, default=None)
+    parser.add_argument('-s', '--sample-cap', help='max number of values of\
+                        one metric in one utilization bin used in GMM fit,\
+                        larger bins are sampled by quantile strata',
+                        type=int, default=None)
+    parser.add_argument('-r', '--incremental', help='rebuild existing model,\
+                        refit only workloads whose recorded data or build\
+                        arguments changed, or new workloads',
+                        action='store_true')
     parser.add_argument('-o', '--offline', help='do offline analysis based on\
                         given metrics file', action='store_true')
+    parser.add_argument('-n', '--suspects', help='max number of contender\
+                        suspects reported for one contention in offline\
+                        analysis', type=int, default=3)
     parser.add_argument('-i', '--key-cid', help='use container id in workload\
                         configuration file as key id', action='store_true')
 
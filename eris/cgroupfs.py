@@ -0,0 +1,79 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements cgroup control file access with cached fds """
+
+from __future__ import print_function
+
+import os
+
+
+class CgroupFs(object):
+    """
+    This class writes cgroup control files through cached file descriptors,
+    writes of unchanged values are skipped
+    """
+
+    def __init__(self):
+        self.fds = dict()
+        self.values = dict()
+
+    @staticmethod
+    def read(path):
+        """
+        Read one cgroup control file
+            path - full path of control file
+        """
+        with open(path, 'r') as cgf:
+            return cgf.read().strip()
+
+    def _close(self, path):
+        fd = self.fds.pop(path, None)
+        if fd is not None:
+            os.close(fd)
+        self.values.pop(path, None)
+
+    def write(self, path, value):
+        """
+        Write value to cgroup control file, return True if the value is
+        written, False if the same value was written already
+            path - full path of control file
+            value - value to be written
+        """
+        value = str(value)
+        if self.values.get(path) == value:
+            return False
+        try:
+            fd = self.fds.get(path)
+            if fd is None:
+                fd = os.open(path, os.O_WRONLY)
+                self.fds[path] = fd
+            os.write(fd, value.encode('utf-8'))
+        except OSError:
+            self._close(path)
+            raise
+        self.values[path] = value
+        return True
+
+    def release(self, cgroup_path):
+        """
+        Close cached file descriptors of one cgroup
+            cgroup_path - cgroup directory, e.g. container is finished
+        """
+        prefix = os.path.join(cgroup_path, '')
+        for path in [p for p in self.fds if p.startswith(prefix)]:
+            self._close(path)
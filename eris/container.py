@@ -25,12 +25,13 @@ from __future__ import division
 import subprocess
 import time
 
-from collections import deque
-from itertools import islice
 from datetime import datetime
 from enum import Enum
 from os.path import join as path_join
 from analyze.analyzer import Metric
+from analyze.history import MetricHistory
+from analyze.record import MetricRecord
+from pidresolver import PidResolver
 
 
 class Contention(Enum):
@@ -47,10 +48,11 @@ class Container(object):
     This class is the abstraction of one task, container metrics and
     contention detection method are encapsulated in this module
     """
+    HISTORY_COLUMNS = {Metric.L3OCC: 0, Metric.NF: 1}
 
     def __init__(
             self, cgroup_driver, cid, name, pids, verbose,
-            thresh=[], tdp_thresh=[], history_depth=5):
+            thresh=None, tdp_thresh=[], history_depth=5):
         self.cid = cid
         self.name = name
         self.pids = pids
@@ -60,9 +62,10 @@ class Container(object):
         self.thresh = thresh
         self.tdp_thresh = tdp_thresh
         self.verbose = verbose
-        self.metrics = dict()
+        self.metrics = MetricRecord()
         self.history_depth = history_depth + 1
-        self.metrics_history = deque([], self.history_depth)
+        self.metrics_history = MetricHistory(
+            len(Container.HISTORY_COLUMNS), self.history_depth)
         self.cpusets = []
         if cgroup_driver == 'systemd':
             self.con_path = 'docker-' + cid + '.scope'
@@ -70,31 +73,41 @@ class Container(object):
         else:
             self.con_path = cid
             self.parent_path = 'docker/'
+        self.perf_cgroup_path = '/sys/fs/cgroup/perf_event/' +\
+            self.parent_path + self.con_path
+        self.pid_resolver = PidResolver(self.perf_cgroup_path)
 
     def __str__(self):
+        return ','.join(str(col) for col in self.get_record()) + '\n'
+
+    def get_record(self):
+        """ metrics record of container in recorded column order """
         metrics = self.metrics
-        cols = [
-            metrics['time'],
+        return [
+            metrics.time,
             self.cid,
             self.name,
-            metrics[Metric.INST],
-            metrics[Metric.CYC],
-            metrics[Metric.CPI],
-            metrics[Metric.L3MPKI],
-            metrics[Metric.L3MISS],
-            metrics[Metric.NF],
+            metrics.inst,
+            metrics.cyc,
+            metrics.cpi,
+            metrics.l3mpki,
+            metrics.l3miss,
+            metrics.nf,
             self.utils,
-            metrics[Metric.L3OCC],
-            metrics[Metric.MBL],
-            metrics[Metric.MBR],
-            metrics[Metric.L2STALL],
-            metrics[Metric.MEMSTALL],
-            metrics[Metric.L2SPKI],
-            metrics[Metric.MSPKI],
+            metrics.l3occ,
+            metrics.mbl,
+            metrics.mbr,
+            metrics.l2stall,
+            metrics.memstall,
+            metrics.l2spki,
+            metrics.mspki,
         ]
-        return ','.join(str(col) for col in cols) + '\n'
 
-    def update_metrics(self, row_tuple):
+    def update_metrics(self, row):
+        """
+        update metrics from one recorded metrics row
+            row - mapping from column name to value
+        """
         key_mappings = [('time', str), (Metric.INST, int), (Metric.CYC, int),
                         (Metric.CPI, float), (Metric.L3MPKI, float),
                         (Metric.L3MISS, int), (Metric.NF, float),
@@ -103,21 +116,13 @@ class Container(object):
                         (Metric.MEMSTALL, int), (Metric.L2SPKI, float),
                         (Metric.MSPKI, float)]
         for key, converter in key_mappings:
-            self.metrics[key] = converter(row_tuple[1][key])
-        self.utils = float(row_tuple[1][Metric.UTIL])
+            self.metrics[key] = converter(row[key])
+        self.utils = float(row[Metric.UTIL])
         self.update_metrics_history()
 
     def get_history_delta_by_type(self, column_name):
-        length = len(self.metrics_history)
-        if length == 0:
-            return 0
-        if length == 1:
-            return self.metrics_history[0][column_name]
-        data_sum = sum(m[column_name] for m in
-                       list(islice(self.metrics_history, length - 1)))
-        data_avg = float(data_sum) / (length - 1)
-        data_delta = self.metrics_history[-1][column_name] - data_avg
-        return data_delta
+        return self.metrics_history.delta(
+            Container.HISTORY_COLUMNS[column_name])
 
     def get_llcoccupany_delta(self):
         return self.get_history_delta_by_type(Metric.L3OCC)
@@ -126,8 +131,8 @@ class Container(object):
         return self.get_history_delta_by_type(Metric.NF)
 
     def get_latest_mbt(self):
-        mbl = self.metrics.get(Metric.MBL, 0)
-        mbr = self.metrics.get(Metric.MBR, 0)
+        mbl = getattr(self.metrics, 'mbl', 0)
+        mbr = getattr(self.metrics, 'mbr', 0)
 
         return mbl + mbr
 
@@ -136,34 +141,31 @@ class Container(object):
         self.update_cpu_usage()
         metrics = self.metrics
         if self.metrics:
-            metrics['time'] = timestamp
-            if metrics[Metric.INST] == 0:
-                metrics[Metric.CPI] = 0
-                metrics[Metric.L3MPKI] = 0
-                metrics[Metric.L2SPKI] = 0
-                metrics[Metric.MSPKI] = 0
+            metrics.time = timestamp
+            inst = metrics.inst
+            if inst == 0:
+                metrics.cpi = 0
+                metrics.l3mpki = 0
+                metrics.l2spki = 0
+                metrics.mspki = 0
             else:
-                metrics[Metric.CPI] = metrics[Metric.CYC] /\
-                    metrics[Metric.INST]
-                metrics[Metric.L3MPKI] = metrics[Metric.L3MISS] * 1000 /\
-                    metrics[Metric.INST]
-                metrics[Metric.L2SPKI] = metrics[Metric.L2STALL] * 1000 /\
-                    metrics[Metric.INST]
-                metrics[Metric.MSPKI] = metrics[Metric.MEMSTALL] * 1000 /\
-                    metrics[Metric.INST]
+                metrics.cpi = metrics.cyc / inst
+                metrics.l3mpki = metrics.l3miss * 1000 / inst
+                metrics.l2spki = metrics.l2stall * 1000 / inst
+                metrics.mspki = metrics.memstall * 1000 / inst
             if self.utils == 0:
-                metrics[Metric.NF] = 0
+                metrics.nf = 0
             else:
-                metrics[Metric.NF] = int(metrics[Metric.CYC] / interval /
-                                         10000 / self.utils)
+                metrics.nf = int(metrics.cyc / interval / 10000 / self.utils)
         return metrics
 
-    def update_pids(self, pids):
+    def update_pids(self):
         """
-        update process ids of one Container
-            pids - pid list of Container
+        update thread ids of one Container from its perf_event cgroup, return
+        True if thread ids changed since last update
         """
-        self.pids = pids
+        self.pids, changed = self.pid_resolver.resolve()
+        return changed
 
     def update_cpu_usage(self):
         """ calculate cpu usage of container """
@@ -188,73 +190,45 @@ class Container(object):
         self.historyDepth if histroy metrics data length exceeds the
         self.historyDepth, the oldest data will be erased
         '''
-        self.metrics_history.append(self.metrics.copy())
+        metrics = self.metrics
+        self.metrics_history.append((metrics.l3occ, metrics.nf))
 
-    def __detect_in_bin(self, thresh):
+    def report_contention(self, thresh, contend_res):
+        """
+        print detected contention of container
+            thresh - thresholds of utilization bin in which it is detected
+            contend_res - list of detected contention
+        """
         metrics = self.metrics
-        contend_res = []
-        if metrics[Metric.CPI] > thresh['cpi']:
-            unk_res = True
-            if metrics[Metric.L3MPKI] > thresh['mpki']:
-                print('Last Level Cache contention is detected at %s' %
-                      metrics['time'])
-                print('Latency critical container %s, CPI = %f, threshold =\
+        if Contention.LLC in contend_res:
+            print('Last Level Cache contention is detected at %s' %
+                  metrics.time)
+            print('Latency critical container %s, CPI = %f, threshold =\
 %f, MPKI = %f, threshold = %f, L2SPKI = %f, threshold = %f' %
-                      (self.name, metrics[Metric.CPI], thresh['cpi'],
-                       metrics[Metric.L3MPKI], thresh['mpki'],
-                       metrics[Metric.L2SPKI], thresh['l2spki']))
-                unk_res = False
-                contend_res.append(Contention.LLC)
-            if metrics[Metric.MBL] + metrics[Metric.MBR] < thresh['mb'] or\
-               metrics[Metric.MSPKI] > thresh['mspki']:
-                print('Memory Bandwidth contention detected at %s' %
-                      metrics['time'])
-                print('Latency critical container %s, CPI = %f, threshold =\
+                  (self.name, metrics.cpi, thresh.cpi,
+                   metrics.l3mpki, thresh.mpki,
+                   metrics.l2spki, thresh.l2spki))
+        if Contention.MEM_BW in contend_res:
+            print('Memory Bandwidth contention detected at %s' %
+                  metrics.time)
+            print('Latency critical container %s, CPI = %f, threshold =\
 %f, MBL = %f, MBR = %f, threshold = %f, MSPKI = %f, threshold = %f' %
-                      (self.name, metrics[Metric.CPI], thresh['cpi'],
-                       metrics[Metric.MBL], metrics[Metric.MBR], thresh['mb'],
-                       metrics[Metric.MSPKI], thresh['mspki']))
-                unk_res = False
-                contend_res.append(Contention.MEM_BW)
-            if unk_res:
-                print('Performance is impacted at %s' %
-                      metrics['time'])
-                print('Latency critical container %s, CPI = %f, threshold =\
-%f' % (self.name, metrics[Metric.CPI], thresh['cpi']))
-                contend_res.append(Contention.UNKN)
-
-        return contend_res
-
-    def tdp_contention_detect(self):
-        """ detect TDP contention in container """
-        if not self.tdp_thresh:
-            return None
-
+                  (self.name, metrics.cpi, thresh.cpi,
+                   metrics.mbl, metrics.mbr, thresh.mb,
+                   metrics.mspki, thresh.mspki))
+        if Contention.UNKN in contend_res:
+            print('Performance is impacted at %s' %
+                  metrics.time)
+            print('Latency critical container %s, CPI = %f, threshold =\
+%f' % (self.name, metrics.cpi, thresh.cpi))
+
+    def report_tdp_contention(self, contended):
+        """
+        print TDP contention detection of container
+            contended - True if TDP contention is detected
+        """
         if self.verbose:
-            print(self.utils, self.metrics[Metric.NF], self.tdp_thresh['util'],
+            print(self.utils, self.metrics.nf, self.tdp_thresh['util'],
                   self.tdp_thresh['bar'])
-
-        if self.utils >= self.tdp_thresh['util'] and\
-           self.metrics[Metric.NF] < self.tdp_thresh['bar']:
+        if contended:
             print('TDP Contention Alert!')
-            return Contention.TDP
-
-        return None
-
-    def contention_detect(self):
-        """ detect resouce contention after find proper utilization bin """
-        if not self.thresh:
-            return []
-
-        for i in range(0, len(self.thresh)):
-            thresh = self.thresh[i]
-            if self.utils < thresh['util_start']:
-                if i == 0:
-                    return []
-
-                return self.__detect_in_bin(self.thresh[i - 1])
-
-            if self.utils >= thresh['util_start']:
-                if self.utils < thresh['util_end'] or\
-                   i == len(self.thresh) - 1:
-                    return self.__detect_in_bin(thresh)
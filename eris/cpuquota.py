@@ -20,8 +20,8 @@
 from __future__ import print_function
 from __future__ import division
 
-import subprocess
 from datetime import datetime
+from cgroupfs import CgroupFs
 from mresource import Resource
 
 
@@ -38,6 +38,8 @@ class CpuQuota(Resource):
 
     def __init__(self, sysMaxUtil, minMarginRatio, verbose):
         super(CpuQuota, self).__init__()
+        self.cgroupfs = CgroupFs()
+        self.periods = dict()
         self.min_margin_ratio = minMarginRatio
         self.update_max_sys_util(sysMaxUtil)
         self.update()
@@ -61,19 +63,29 @@ class CpuQuota(Resource):
         self.quota_step = self.quota_max / Resource.BUGET_LEV_MAX
 
     @staticmethod
-    def __get_cfs_period(container):
-        result = subprocess.run(['cat', CpuQuota.PREFIX +
-                                 container.parent_path +
-                                 container.con_path +
-                                 '/cpu.cfs_period_us'],
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
-        res = result.stdout.decode('utf-8').strip()
+    def _cgroup_path(container):
+        return CpuQuota.PREFIX + container.parent_path + container.con_path
+
+    def __get_cfs_period(self, container):
+        if container.cid in self.periods:
+            return self.periods[container.cid]
         try:
-            period = int(res)
-            return period
-        except ValueError:
+            period = int(self.cgroupfs.read(self._cgroup_path(container) +
+                                            '/cpu.cfs_period_us'))
+        except (ValueError, IOError):
             return 0
+        self.periods[container.cid] = period
+        return period
+
+    def _write(self, container, filename, value, name):
+        try:
+            if self.cgroupfs.write(self._cgroup_path(container) + filename,
+                                   value):
+                print(datetime.now().isoformat(' ') + ' set container ' +
+                      container.name + ' ' + name + ' to ' + str(value))
+        except (IOError, OSError) as e:
+            print(datetime.now().isoformat(' ') + ' failed to set container ' +
+                  container.name + ' ' + name + ': ' + str(e))
 
     def __set_quota(self, container, quota):
         period = self.__get_cfs_period(container)
@@ -82,25 +94,22 @@ class CpuQuota(Resource):
             rquota = int(quota * period / CpuQuota.CPU_QUOTA_CORE)
         else:
             rquota = quota
-        subprocess.Popen('echo ' + str(rquota) + ' > ' +
-                         CpuQuota.PREFIX + container.parent_path +
-                         container.con_path + '/cpu.cfs_quota_us',
-                         shell=True)
-        print(datetime.now().isoformat(' ') + ' set container ' +
-              container.name + ' cpu quota to ' + str(rquota))
+        self._write(container, '/cpu.cfs_quota_us', rquota, 'cpu quota')
 
-    @staticmethod
-    def set_share(container, share):
+    def set_share(self, container, share):
         """
         Set CPU share in container
             share - given CPU share value
         """
-        subprocess.Popen('echo ' + str(share) + ' > ' +
-                         CpuQuota.PREFIX + container.parent_path +
-                         container.con_path + '/cpu.shares',
-                         shell=True)
-        print(datetime.now().isoformat(' ') + ' set container ' +
-              container.name + ' cpu share to ' + str(share))
+        self._write(container, '/cpu.shares', share, 'cpu share')
+
+    def release(self, container):
+        """
+        Drop cached cgroup state of finished container
+            container - finished container
+        """
+        self.cgroupfs.release(self._cgroup_path(container))
+        self.periods.pop(container.cid, None)
 
     def budgeting(self, bes, lcs):
         newq = int(self.cpu_quota / len(bes))
@@ -23,12 +23,10 @@ from __future__ import division
 import os
 import sys
 
-import subprocess
 import time
 import traceback
 
 import docker
-import numpy as np
 
 from argparse import ArgumentParser, FileType
 from datetime import datetime
@@ -40,11 +38,19 @@ from threading import Thread
 
 from container import Container, Contention
 from cpuquota import CpuQuota
+from inventory import ContainerInventory
 from llcoccup import LlcOccup
 from mresource import Resource
 from naivectrl import NaiveController
+from pgosmon import PgosMonitor
 from prometheus import PrometheusClient
+from recorder import Recorder
 from analyze.analyzer import Metric, Analyzer
+from analyze.columnar import INT, FLOAT, STR, TIME
+from analyze.contender import ContenderIndex
+from analyze.cycletimer import CycleTimer
+from analyze.detection import FleetDetector
+from analyze.online import OnlineModel
 
 __version__ = 0.8
 
@@ -63,10 +69,20 @@ class Context(object):
         self.be_set = {}
         self.cpuq = None
         self.llc = None
+        self.pgos = None
+        self.inventory = None
+        self.recorder = None
+        self.util_file = Analyzer.UTIL_FILE
+        self.metric_file = Analyzer.METRIC_FILE
         self.controllers = {}
         self.util_cons = dict()
         self.metric_cons = dict()
         self.analyzer = None
+        self.online = None
+        self.fleet = FleetDetector()
+        self.model_version = 0
+        self.util_timer = CycleTimer('util')
+        self.metric_timer = CycleTimer('metric')
         self.cgroup_driver = 'cgroupfs'
 
     @property
@@ -82,51 +98,128 @@ class Context(object):
         return self._prometheus
 
 
-def each_container_pgos_metric(lines, delim='\t'):
-    metric_mappings = {
-        'cycles': (Metric.CYC, int),
-        'instructions': (Metric.INST, int),
-        'LLC misses': (Metric.L3MISS, int),
-        'stalls L2 miss': (Metric.L2STALL, int),
-        'stalls memory load': (Metric.MEMSTALL, int),
-        'LLC occupancy': (Metric.L3OCC, int),
-        'Memory bandwidth local': (Metric.MBL, float),
-        'Memory bandwidth remote': (Metric.MBR, float),
-    }
+PGOS_METRICS = {
+    'cycles': (Metric.CYC, int),
+    'instructions': (Metric.INST, int),
+    'LLC misses': (Metric.L3MISS, int),
+    'stalls L2 miss': (Metric.L2STALL, int),
+    'stalls memory load': (Metric.MEMSTALL, int),
+    'LLC occupancy': (Metric.L3OCC, int),
+    'Memory bandwidth local': (Metric.MBL, float),
+    'Memory bandwidth remote': (Metric.MBR, float),
+}
+
 
+def each_container_pgos_metric(lines, delim='\t'):
+    """
+    Parse pgos output lines, yield container id, metric, value and timestamp
+        lines - pgos output lines
+        delim - column delimiter
+    """
     for line in lines:
         items = line.split(delim)
         if len(items) < 4:
             continue
         cid, metric_name, timestamp, val = items[:4]
-        if metric_name in metric_mappings:
-            name, converter = metric_mappings[metric_name]
-            yield cid, {name: converter(val)}, int(timestamp)
+        if metric_name in PGOS_METRICS:
+            name, converter = PGOS_METRICS[metric_name]
+            yield cid, name, converter(val), int(timestamp)
 
 
-def detect_contender(metric_cons, contention_type, container_contended):
-    resource_delta_max = -np.Inf
-    suspect = "unknown"
+def build_contender_index(metric_cons):
+    """
+    Rank all containers once per cycle as suspects of each contention type
+        metric_cons - cached container map
+    """
+    cids = list(metric_cons)
+    cons = [metric_cons[cid] for cid in cids]
+    return ContenderIndex(cids, {
+        Contention.LLC: [con.get_llcoccupany_delta() for con in cons],
+        Contention.MEM_BW: [con.get_latest_mbt() for con in cons],
+        Contention.TDP: [con.get_freq_delta() for con in cons],
+    })
 
-    for cid, container in metric_cons.items():
-        delta = 0
-        if cid == container_contended.cid:
-            continue
-        if contention_type == Contention.LLC:
-            delta = container.get_llcoccupany_delta()
-        elif contention_type == Contention.MEM_BW:
-            delta = container.get_latest_mbt()
-        elif contention_type == Contention.TDP:
-            delta = container.get_freq_delta()
 
-        if delta > 0 and delta > resource_delta_max:
-            resource_delta_max = delta
-            suspect = container.name
+def detect_contender(metric_cons, index, contention_type, container_contended,
+                     count):
+    """
+    Report top suspects of one contention with their scores
+        metric_cons - cached container map
+        index - contender index of current cycle
+        contention_type - contention detected
+        container_contended - contended container
+        count - max number of suspects reported
+    """
+    suspects = index.top(contention_type, container_contended.cid, count)
+    if suspects:
+        suspect = ', '.join('%s (%f)' % (metric_cons[cid].name, score)
+                            for cid, score in suspects)
+    else:
+        suspect = "unknown"
 
     print('Contention %s for container %s: Suspect is %s' %
           (contention_type, container_contended.name, suspect))
 
 
+def add_fleet_row(fleet, con):
+    """
+    Add current metrics of one container to fleet detector
+        fleet - FleetDetector of current cycle
+        con - container with metrics of current cycle
+    """
+    metrics = con.metrics
+    fleet.add(con.thresh, con.tdp_thresh, con.utils, metrics.cpi,
+              metrics.l3mpki, metrics.mbl + metrics.mbr, metrics.nf,
+              metrics.mspki)
+
+
+def detect_fleet(fleet, cons):
+    """
+    Detect contention of containers added to fleet detector in one pass,
+    then report it and yield list of detected contention of each container
+    in added order
+        fleet - FleetDetector with one row per container
+        cons - containers in fleet detector row order
+    """
+    result = fleet.detect()
+    for row, con in enumerate(cons):
+        contend_res = []
+        if result.llc[row]:
+            contend_res.append(Contention.LLC)
+        if result.mem_bw[row]:
+            contend_res.append(Contention.MEM_BW)
+        if result.unkn[row]:
+            contend_res.append(Contention.UNKN)
+        if contend_res:
+            con.report_contention(con.thresh.bins[result.bins[row]],
+                                  contend_res)
+
+        if con.tdp_thresh:
+            con.report_tdp_contention(result.tdp[row])
+        if result.tdp[row]:
+            contend_res.append(Contention.TDP)
+        yield contend_res
+
+
+def detect_contention(ctx, detected, contention, contention_map):
+    """
+    Detect contention of latency critical containers added to fleet
+    detector in one pass and report it per container in added order
+        ctx - agent context
+        detected - list of (key, container) in fleet detector row order
+        contention - contention flags of this cycle, updated in place
+        contention_map - contended container to contention flags seen
+    """
+    verdicts = detect_fleet(ctx.fleet, [con for _, con in detected])
+    for (key, con), contend_res in zip(detected, verdicts):
+        for contend in contend_res:
+            contention[contend] = True
+        if contend_res:
+            contention_map[con] = contention.copy()
+        elif ctx.online:
+            ctx.online.add(key, con.utils, con.metrics)
+
+
 def set_metrics(ctx, data):
     """
     This function collect metrics from pgos tool and trigger resource
@@ -136,9 +229,11 @@ def set_metrics(ctx, data):
     """
     timestamp = datetime.now()
 
-    for cid, metric, _ in each_container_pgos_metric(data):
-        container = ctx.metric_cons[cid]
-        container.metrics.update(metric)
+    timer = ctx.metric_timer
+    for cid, metric, value, _ in each_container_pgos_metric(data):
+        if cid in ctx.metric_cons:
+            ctx.metric_cons[cid].metrics[metric] = value
+    timer.mark('parse')
 
     contention = {
         Contention.LLC: False,
@@ -148,7 +243,9 @@ def set_metrics(ctx, data):
     contention_map = {}
     bes = []
     lcs = []
+    detected = []
     findbe = False
+    ctx.fleet.reset()
     for cid, con in ctx.metric_cons.items():
         key = con.cid if ctx.args.key_cid else con.name
         metrics = con.get_full_metrics(timestamp, ctx.args.metric_interval)
@@ -157,87 +254,59 @@ def set_metrics(ctx, data):
                 con.update_metrics_history()
 
             if ctx.args.record:
-                with open(Analyzer.METRIC_FILE, 'a') as metricf:
-                    metricf.write(str(con))
+                ctx.recorder.write(ctx.metric_file, con.get_record())
 
                 if ctx.args.enable_prometheus:
                     ctx.prometheus.send_metrics(con.name, con.utils,
-                                                metrics[Metric.CYC],
-                                                metrics[Metric.L3MISS],
-                                                metrics[Metric.INST],
-                                                metrics[Metric.NF],
-                                                metrics[Metric.MBR] +
-                                                metrics[Metric.MBL],
-                                                metrics[Metric.L3OCC], 0)
+                                                metrics.cyc, metrics.l3miss,
+                                                metrics.inst, metrics.nf,
+                                                metrics.mbr + metrics.mbl,
+                                                metrics.l3occ, 0)
 
         if key in ctx.lc_set:
             if ctx.args.exclusive_cat:
                 lcs.append(con)
-            if metrics:
-                if ctx.args.detect:
-                    contend_res = con.contention_detect()
-                    if_contended = False
-
-                    if contend_res:
-                        if_contended = True
-                        for contend in contend_res:
-                            contention[contend] = True
-
-                    tdp_contend = con.tdp_contention_detect()
-                    if tdp_contend is not None:
-                        if_contended = True
-                        contention[tdp_contend] = True
-
-                    if if_contended:
-                        contention_map[con] = contention.copy()
+            if metrics and ctx.args.detect:
+                add_fleet_row(ctx.fleet, con)
+                detected.append((key, con))
 
         if key in ctx.be_set:
             findbe = True
             bes.append(con)
+    timer.mark('metrics')
 
-    if ctx.args.detect:
+    if detected:
+        detect_contention(ctx, detected, contention, contention_map)
+
+    if ctx.args.detect and contention_map:
+        index = build_contender_index(ctx.metric_cons)
         for container_contended, contention_list in contention_map.items():
             for contention_type, contention_type_if_happened\
                     in contention_list.items():
                 if contention_type_if_happened and\
                    contention_type != Contention.UNKN:
-                    detect_contender(ctx.metric_cons, contention_type,
-                                     container_contended)
+                    detect_contender(ctx.metric_cons, index, contention_type,
+                                     container_contended, ctx.args.suspects)
+    timer.mark('detect')
     if findbe and ctx.args.control:
         for contention, flag in contention.items():
             if contention in ctx.controllers:
                 ctx.controllers[contention].update(bes, lcs, flag, False)
+        timer.mark('control')
 
 
 def remove_finished_containers(cids, consmap):
     """
-    remove finished containers from cached container map
+    remove finished containers from cached container map, return removed
+    containers
         cids - container id list from docker
         mon_cons - cached container map
     """
+    removed = []
     for cid in consmap.copy():
         if cid not in cids:
-            del consmap[cid]
-
-
-def list_tids(pid):
-    tids = []
-    try:
-        tids = os.listdir('/proc/' + pid + '/task')
-    except Exception:
-        traceback.print_exc(file=sys.stdout)
-    return tids
-
-
-def list_pids(container):
-    """
-    list all process id of one container
-        container - container object listed from Docker
-    """
-    procs = container.top()['Processes']
-    pids = [pid[1] for pid in procs] if procs else []
-    return [tid for pid in pids
-            for tid in list_tids(pid)] if pids else []
+            removed.append(consmap.pop(cid))
+    return removed
 
 
 def mon_util_cycle(ctx):
@@ -251,18 +320,23 @@ def mon_util_cycle(ctx):
     date = datetime.now().isoformat()
     bes = []
     newbe = False
-    containers = ctx.docker_client.containers.list()
-    remove_finished_containers({c.id for c in containers}, ctx.util_cons)
+    timer = ctx.util_timer
+    containers = ctx.inventory.list()
+    finished = remove_finished_containers({c.id for c in containers},
+                                          ctx.util_cons)
+    if ctx.args.control:
+        for con in finished:
+            ctx.cpuq.release(con)
+    timer.mark('list')
 
     for container in containers:
         cid = container.id
         name = container.name
-        pids = list_pids(container)
         key = cid if ctx.args.key_cid else name
         if cid in ctx.util_cons:
             con = ctx.util_cons[cid]
         else:
-            con = Container(ctx.cgroup_driver, cid, name, pids,
+            con = Container(ctx.cgroup_driver, cid, name, [],
                             ctx.args.verbose)
             ctx.util_cons[cid] = con
             if ctx.args.control:
@@ -273,9 +347,7 @@ def mon_util_cycle(ctx):
                     ctx.cpuq.set_share(con, CpuQuota.CPU_SHARE_LC)
         con.update_cpu_usage()
         if ctx.args.record:
-            with open(Analyzer.UTIL_FILE, 'a') as utilf:
-                utilf.write(date + ',' + cid + ',' + name +
-                            ',' + str(con.utils) + '\n')
+            ctx.recorder.write(ctx.util_file, [date, cid, name, con.utils])
 
         if key in ctx.lc_set:
             lc_utils = lc_utils + con.utils
@@ -285,11 +357,13 @@ def mon_util_cycle(ctx):
             be_utils = be_utils + con.utils
             bes.append(con)
 
+    timer.mark('cgroup')
+
     loadavg = os.getloadavg()[0]
     if ctx.args.record:
-        with open(Analyzer.UTIL_FILE, 'a') as utilf:
-            utilf.write(date + ',,lcs,' + str(lc_utils) + '\n')
-            utilf.write(date + ',,loadavg1m,' + str(loadavg) + '\n')
+        ctx.recorder.write(ctx.util_file, [date, '', 'lcs', lc_utils])
+        ctx.recorder.write(ctx.util_file, [date, '', 'loadavg1m', loadavg])
+        timer.mark('record')
 
     if lc_utils > ctx.sysmax_util:
         ctx.sysmax_util = lc_utils
@@ -305,6 +379,7 @@ def mon_util_cycle(ctx):
         if not ctx.args.enable_hold:
             hold = False
         ctx.controllers[Contention.CPU_CYC].update(bes, [], exceed, hold)
+    timer.mark('control')
 
 
 def mon_metric_cycle(ctx):
@@ -312,28 +387,41 @@ def mon_metric_cycle(ctx):
     Platform metrics monitor timer function
         ctx - agent context
     """
-    containers = ctx.docker_client.containers.list()
-    cgroups = []
-    cids = []
+    containers = ctx.inventory.list()
+    cgroups = dict()
     bes = []
     lcs = []
     newcon = False
     newbe = False
+    timer = ctx.metric_timer
     remove_finished_containers({c.id for c in containers}, ctx.metric_cons)
+    if ctx.online and ctx.online.version != ctx.model_version:
+        ctx.model_version = ctx.online.version
+        for con in ctx.metric_cons.values():
+            key = con.cid if ctx.args.key_cid else con.name
+            con.thresh = ctx.analyzer.get_thresh_table(key)
+            con.tdp_thresh = ctx.analyzer.get_tdp_thresh(key)
+    timer.mark('list')
 
     for container in containers:
         cid = container.id
         name = container.name
-        pids = list_pids(container)
         key = cid if ctx.args.key_cid else name
         if cid in ctx.metric_cons:
             con = ctx.metric_cons[cid]
-            con.update_pids(pids)
+            if con.update_pids() and ctx.args.control and\
+               not ctx.args.disable_cat:
+                # threads started since last cycle join CAT class of task
+                if key in ctx.be_set:
+                    newbe = True
+                elif key in ctx.lc_set:
+                    newcon = True
         else:
-            thresh = ctx.analyzer.get_thresh(key)
+            thresh = ctx.analyzer.get_thresh_table(key)
             tdp_thresh = ctx.analyzer.get_tdp_thresh(key)
-            con = Container(ctx.cgroup_driver, cid, name, pids,
+            con = Container(ctx.cgroup_driver, cid, name, [],
                             ctx.args.verbose, thresh, tdp_thresh)
+            con.update_pids()
             ctx.metric_cons[cid] = con
             con.update_cpu_usage()
             if ctx.args.control and not ctx.args.disable_cat:
@@ -346,49 +434,44 @@ def mon_metric_cycle(ctx):
         if key in ctx.be_set:
             bes.append(con)
 
-        cids.append(cid)
-        cgroups.append('/sys/fs/cgroup/perf_event/' +
-                       con.parent_path + con.con_path)
+        cgroups[cid] = con.perf_cgroup_path
     if newbe or newcon and bes and ctx.args.exclusive_cat:
         ctx.llc.budgeting(bes, lcs)
+    timer.mark('pids')
 
-    if cgroups:
-        period = str(ctx.args.metric_interval - 2)
-        args = [
-            './pgos',
-            '-cids', ','.join(cids),
-            '-cgroup', ','.join(cgroups),
-            '-period', period,
-            '-frequency', period,
-            '-cycle', '1',
-            '-core', str(cpu_count()),
-        ]
-        if ctx.args.verbose:
-            print(' '.join(args))
-        try:
-            output = subprocess.check_output(args, stderr=subprocess.STDOUT)
-            data = output.decode('utf-8').splitlines()
+    try:
+        ctx.pgos.sync(cgroups)
+        data = ctx.pgos.get_sample(ctx.args.metric_interval)
+        timer.mark('pgos')
+        if data:
             if ctx.args.verbose:
-                print(output.decode('utf-8'))
+                print('\n'.join(data))
             set_metrics(ctx, data)
-        except Exception:
-            traceback.print_exc(file=sys.stdout)
+    except Exception:
+        traceback.print_exc(file=sys.stdout)
 
 
-def monitor(func, ctx, interval):
+def monitor(func, ctx, interval, timer):
     """
     wrap schedule timer function
         ctx - agent context
         interval - timer interval
+        timer - CycleTimer measuring phases of each cycle
     """
     next_time = time.time()
     while not ctx.shutdown:
+        timer.start()
         func(ctx)
+        timer.finish()
+        missed = 0
         while True:
             next_time += interval
             delta = next_time - time.time()
             if delta > 0:
                 break
+            missed += 1
+        if ctx.args.enable_prometheus:
+            ctx.prometheus.send_cycle(timer.loop, timer.phases, missed)
         time.sleep(delta)
 
 
@@ -459,6 +542,9 @@ def parse_arguments():
     parser.add_argument('-r', '--record', help='record container CPU\
                         utilizaton and platform metrics in csv file',
                         action='store_true')
+    parser.add_argument('-o', '--record-format', help='file format used to\
+                        record container CPU utilization and platform\
+                        metrics', choices=['csv', 'columnar'], default='csv')
     parser.add_argument('-i', '--key-cid', help='use container id in workload\
                         configuration file as key id', action='store_true')
     parser.add_argument('-e', '--enable-hold', help='keep container resource\
@@ -484,6 +570,15 @@ def parse_arguments():
                         type=float, default=0.5)
     parser.add_argument('-t', '--thresh-file', help='threshold model file build\
                         from analyze.py tool', default=Analyzer.THRESH_FILE)
+    parser.add_argument('-s', '--suspects', help='max number of contender\
+                        suspects reported for one contention', type=int,
+                        default=3)
+    parser.add_argument('-a', '--online-model', help='update threshold model\
+                        online from metrics of not contended latency critical\
+                        tasks while in contention detection, refitted\
+                        thresholds stay within 10%% of model file thresholds\
+                        and are written to a separate .online.json file',
+                        action='store_true')
 
     args = parser.parse_args()
     if args.verbose:
@@ -504,6 +599,10 @@ def main():
     if ctx.args.enable_prometheus:
         ctx.prometheus.start()
 
+    ctx.inventory = ContainerInventory(ctx.docker_client,
+                                       verbose=ctx.args.verbose)
+    ctx.inventory.start()
+
     if ctx.args.control:
         ctx.cpuq = CpuQuota(ctx.sysmax_util, ctx.args.margin_ratio,
                             ctx.args.verbose)
@@ -517,25 +616,44 @@ def main():
             ctx.controllers = {Contention.CPU_CYC: quota_controller,
                                Contention.LLC: llc_controller}
     if ctx.args.record:
-        cols = ['time', 'cid', 'name', Metric.UTIL]
-        with open(Analyzer.UTIL_FILE, 'w') as utilf:
-            utilf.write(','.join(cols) + '\n')
+        columnar = ctx.args.record_format == 'columnar'
+        if columnar:
+            ctx.util_file = Analyzer.UTIL_COL_FILE
+            ctx.metric_file = Analyzer.METRIC_COL_FILE
+        cols = [('time', TIME), ('cid', STR), ('name', STR),
+                (Metric.UTIL, FLOAT)]
+        ctx.recorder = Recorder()
+        ctx.recorder.add_file(ctx.util_file, cols, columnar)
 
     threads = [Thread(target=monitor, args=(mon_util_cycle,
-                                            ctx, ctx.args.util_interval))]
+                                            ctx, ctx.args.util_interval,
+                                            ctx.util_timer))]
 
     if ctx.args.collect_metrics:
         if ctx.args.record:
-            cols = ['time', 'cid', 'name', Metric.INST, Metric.CYC,
-                    Metric.CPI, Metric.L3MPKI, Metric.L3MISS, Metric.NF,
-                    Metric.UTIL, Metric.L3OCC, Metric.MBL, Metric.MBR,
-                    Metric.L2STALL, Metric.MEMSTALL, Metric.L2SPKI,
-                    Metric.MSPKI]
-            with open(Analyzer.METRIC_FILE, 'w') as metricf:
-                metricf.write(','.join(cols) + '\n')
+            cols = [('time', TIME), ('cid', STR), ('name', STR),
+                    (Metric.INST, INT), (Metric.CYC, INT),
+                    (Metric.CPI, FLOAT), (Metric.L3MPKI, FLOAT),
+                    (Metric.L3MISS, INT), (Metric.NF, FLOAT),
+                    (Metric.UTIL, FLOAT), (Metric.L3OCC, INT),
+                    (Metric.MBL, FLOAT), (Metric.MBR, FLOAT),
+                    (Metric.L2STALL, INT), (Metric.MEMSTALL, INT),
+                    (Metric.L2SPKI, FLOAT), (Metric.MSPKI, FLOAT)]
+            ctx.recorder.add_file(ctx.metric_file, cols, columnar)
+        ctx.pgos = PgosMonitor(ctx.args.metric_interval - 2,
+                               ctx.args.metric_interval, cpu_count(),
+                               ctx.args.verbose)
+        if ctx.args.detect and ctx.args.online_model:
+            ctx.online = OnlineModel(ctx.analyzer, verbose=ctx.args.verbose)
         threads.append(Thread(target=monitor,
                               args=(mon_metric_cycle,
-                                    ctx, ctx.args.metric_interval)))
+                                    ctx, ctx.args.metric_interval,
+                                    ctx.metric_timer)))
+
+    if ctx.recorder:
+        ctx.recorder.start()
+    if ctx.online:
+        ctx.online.start()
 
     for thread in threads:
         thread.start()
@@ -548,6 +666,12 @@ def main():
     except KeyboardInterrupt:
         print('Shutdown eris agent ...exiting')
         ctx.shutdown = True
+        if ctx.pgos:
+            ctx.pgos.stop()
+        if ctx.online:
+            ctx.online.stop()
+        if ctx.recorder:
+            ctx.recorder.stop()
     except Exception:
         traceback.print_exc(file=sys.stdout)
 
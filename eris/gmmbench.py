@@ -0,0 +1,135 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module benchmarks GMM component search strategies and per bin sampling
+used in model build against full search on all recorded metrics data.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import os
+import tempfile
+import time
+
+from analyze.analyzer import Analyzer
+
+FENSE_KEYS = ['cpi', 'mpki', 'mb', 'l2spki', 'mspki']
+
+
+def build(args, patience, warm_start, sample_cap):
+    """
+    Build threshold model with given search strategy and sample cap, return
+    build time and thresholds
+    """
+    fd, thresh_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    os.remove(thresh_file)
+    try:
+        analyzer = Analyzer(open(args.workload_conf_file, 'rt'),
+                            thresh_file)
+        start = time.time()
+        analyzer.build_model(args.util_file, args.metric_file, args.thresh,
+                             args.fense_type == 'gmm-strict', args.verbose,
+                             args.jobs, patience, warm_start,
+                             sample_cap=sample_cap)
+        return time.time() - start, analyzer.threshold
+    finally:
+        if os.path.exists(thresh_file):
+            os.remove(thresh_file)
+
+
+def compare(base, other, tolerance):
+    """
+    Compare fenses of two threshold models, return total fense count and
+    fenses differing more than relative tolerance
+    """
+    total = 0
+    changed = []
+    for job, model in base.items():
+        if job == 'lcutilmax':
+            continue
+        bins = {b['util_start']: b for b in
+                other.get(job, {}).get('thresh', [])}
+        for thresh in model['thresh']:
+            obin = bins.get(thresh['util_start'], {})
+            for key in FENSE_KEYS:
+                if key not in thresh:
+                    continue
+                total += 1
+                val = thresh[key]
+                oval = obin.get(key)
+                if oval is None or\
+                   abs(oval - val) > tolerance * max(abs(val), 1e-12):
+                    changed.append((job, thresh['util_start'], key, val,
+                                    oval))
+    return total, changed
+
+
+def main():
+    """ Script entry point. """
+    parser = argparse.ArgumentParser(description='This tool compares GMM\
+                                     component search strategies and per bin\
+                                     sampling with full search on all\
+                                     recorded metrics data, reports build time\
+                                     and changed fenses.')
+    parser.add_argument('workload_conf_file', help='workload configuration\
+                        file describes each task name, type, request cpu\
+                        count', default='workload.json')
+    parser.add_argument('-v', '--verbose', help='increase output verbosity',
+                        action='store_true')
+    parser.add_argument('-t', '--thresh', help='threshold used in outlier\
+                        detection', type=int, default=4)
+    parser.add_argument('-f', '--fense-type', help='fense type used in outlier\
+                        detection', choices=['gmm-strict', 'gmm-normal'],
+                        default='gmm-strict')
+    parser.add_argument('-m', '--metric-file', help='metrics file collected\
+                        from eris agent', default=Analyzer.METRIC_FILE)
+    parser.add_argument('-u', '--util-file', help='Utilization file collected\
+                        from eris agent', default=Analyzer.UTIL_FILE)
+    parser.add_argument('-j', '--jobs', help='number of processes used to\
+                        build model in parallel', type=int, default=1)
+    parser.add_argument('-b', '--bic-patience', help='consecutive component\
+                        counts without BIC improvement before search stops',
+                        type=int, default=None)
+    parser.add_argument('-w', '--warm-start', help='initialize each GMM fit\
+                        from parameters of previous fit', action='store_true')
+    parser.add_argument('-s', '--sample-cap', help='max number of values of\
+                        one metric in one utilization bin used in GMM fit',
+                        type=int, default=None)
+    parser.add_argument('-r', '--tolerance', help='relative difference\
+                        tolerated between fenses', type=float, default=1e-9)
+
+    args = parser.parse_args()
+
+    base_time, base = build(args, None, False, None)
+    print('full search: %.2fs' % base_time)
+    new_time, new = build(args, args.bic_patience, args.warm_start,
+                          args.sample_cap)
+    print('patience=%s warm_start=%s sample_cap=%s: %.2fs, speedup %.2fx' %
+          (args.bic_patience, args.warm_start, args.sample_cap, new_time,
+           base_time / new_time if new_time else float('inf')))
+    total, changed = compare(base, new, args.tolerance)
+    print('%d of %d fenses changed' % (len(changed), total))
+    for job, util, key, val, oval in changed:
+        print('  %s util=%s %s: %s -> %s' % (job, util, key, val, oval))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements running container inventory fed by Docker events """
+
+from __future__ import print_function
+
+import sys
+import time
+import traceback
+
+from threading import Lock, Thread
+
+import docker
+
+
+class ContainerInventory(object):
+    """
+    This class caches running containers in memory, the cache is updated by
+    Docker events stream and reconciled with full container list periodically
+    """
+    RECONCILE_INTERVAL = 60
+
+    def __init__(self, client, reconcile_interval=RECONCILE_INTERVAL,
+                 verbose=False):
+        self.client = client
+        self.reconcile_interval = reconcile_interval
+        self.verbose = verbose
+        self.lock = Lock()
+        self.cons = dict()
+        # containers changed by events while reconcile is listing, None if
+        # no reconcile is in progress
+        self.changes = None
+        self.last_reconcile = 0
+
+    def start(self):
+        """
+        start watching Docker events, then load current containers, so a
+        container started in between is not missed
+        """
+        events = self._subscribe()
+        self.reconcile()
+        watcher = Thread(target=self._watch_events, args=(events,))
+        watcher.daemon = True
+        watcher.start()
+
+    def reconcile(self):
+        """
+        replace cached containers with full list from Docker, events handled
+        while listing are applied again on the new list, return False if
+        another reconcile is in progress
+        """
+        with self.lock:
+            if self.changes is not None:
+                return False
+            self.changes = dict()
+        try:
+            containers = self.client.containers.list()
+            with self.lock:
+                cons = {c.id: c for c in containers}
+                for cid, container in self.changes.items():
+                    if container is None:
+                        cons.pop(cid, None)
+                    else:
+                        cons[cid] = container
+                self.cons = cons
+                self.last_reconcile = time.time()
+        finally:
+            with self.lock:
+                self.changes = None
+        return True
+
+    def _update(self, cid, container):
+        with self.lock:
+            if container is None:
+                self.cons.pop(cid, None)
+            else:
+                self.cons[cid] = container
+            if self.changes is not None:
+                self.changes[cid] = container
+
+    def _on_event(self, event):
+        cid = event.get('id')
+        action = event.get('Action', event.get('status'))
+        if action == 'start':
+            try:
+                container = self.client.containers.get(cid)
+            except docker.errors.NotFound:
+                return
+            self._update(cid, container)
+        elif action in ('die', 'destroy'):
+            self._update(cid, None)
+        else:
+            return
+        if self.verbose:
+            print('container %s %s' % (cid, action))
+
+    def _subscribe(self):
+        return self.client.events(decode=True,
+                                  filters={'type': 'container'})
+
+    def _watch_events(self, events):
+        while True:
+            try:
+                if events is None:
+                    events = self._subscribe()
+                    # events may be lost while stream is broken
+                    self.last_reconcile = 0
+                for event in events:
+                    self._on_event(event)
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                time.sleep(1)
+            events = None
+
+    def list(self):
+        """
+        list running containers, reconcile first if cache is stale and no
+        other reconcile is in progress
+        """
+        if time.time() - self.last_reconcile >= self.reconcile_interval:
+            try:
+                self.reconcile()
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+        with self.lock:
+            return list(self.cons.values())
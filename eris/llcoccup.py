@@ -15,19 +15,20 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-""" This module implements last level cache control based on pqos tool """
+""" This module implements last level cache control based on resctrl """
 
 from __future__ import print_function
 
-import subprocess
 from datetime import datetime
 from mresource import Resource
+from resctrl import ResctrlGroup
 
 
 class LlcOccup(Resource):
     """ This class is the resource class of LLC occupancy """
 
     def __init__(self, init_level, exclusive):
+        self.groups = dict()
         bitcnt = LlcOccup._get_cbm_bit_count()
         self.be_bmp = [hex(((1 << (i + 1)) - 1) << (bitcnt - 1 - i))
                        for i in range(bitcnt)]
@@ -48,22 +49,32 @@ class LlcOccup(Resource):
             setbits = [bit for bit in cbm_bin[2:] if bit == '1']
             return len(setbits)
 
+    def _get_group(self, clsid):
+        if clsid not in self.groups:
+            self.groups[clsid] = ResctrlGroup('COS' + clsid)
+        return self.groups[clsid]
+
     def _budgeting(self, containers, clsid, is_be):
         cpids = []
         cns = []
         for con in containers:
-            cpids.append(','.join(con.pids))
+            cpids.extend(con.pids)
             cns.append(con.name)
 
         bmp = self.be_bmp if is_be else self.lc_bmp
-        cml = 'pqos -I -a' + '\'pid:' + clsid + '=' + ','.join(cpids) + '\''
-        subprocess.Popen(cml, shell=True)
-
-        cml = 'pqos -e' + '\'llc:' + clsid + '=' + bmp[self.quota_level] + '\''
-        subprocess.Popen(cml, shell=True)
+        try:
+            group = self._get_group(clsid)
+            added = group.add_tasks(cpids)
+            written = group.set_l3_mask(int(bmp[self.quota_level], 16))
+        except (IOError, OSError) as e:
+            print(datetime.now().isoformat(' ') + ' failed to set container ' +
+                  ','.join(cns) + ' llc occupancy: ' + str(e))
+            return
 
-        print(datetime.now().isoformat(' ') + ' set container ' +
-              ','.join(cns) + ' llc occupancy to ' + bmp[self.quota_level])
+        if added or written:
+            print(datetime.now().isoformat(' ') + ' set container ' +
+                  ','.join(cns) + ' llc occupancy to ' +
+                  bmp[self.quota_level])
 
     def budgeting(self, bes, lcs):
         if bes:
@@ -0,0 +1,125 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module drives a long-lived pgos process in stream mode """
+
+from __future__ import print_function
+
+import subprocess
+
+from threading import Lock, Thread
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+
+class PgosMonitor(object):
+    """
+    This class starts pgos once, keeps its monitored cgroups in sync with
+    running containers over stdin and collects sample cycles from stdout
+    """
+
+    def __init__(self, period, frequency, core, verbose=False,
+                 binary='./pgos'):
+        self.args = [
+            binary,
+            '-stream',
+            '-period', str(period),
+            '-frequency', str(frequency),
+            '-core', str(core),
+        ]
+        self.verbose = verbose
+        self.proc = None
+        self.cgroups = {}
+        self.samples = Queue()
+        self.lock = Lock()
+
+    def _read_samples(self, proc):
+        lines = []
+        for line in iter(proc.stdout.readline, b''):
+            line = line.decode('utf-8').rstrip('\n')
+            if line:
+                lines.append(line)
+            else:
+                self.samples.put(lines)
+                lines = []
+
+    def _send(self, command):
+        try:
+            self.proc.stdin.write((command + '\n').encode('utf-8'))
+            self.proc.stdin.flush()
+        except (IOError, OSError):
+            pass
+
+    def is_running(self):
+        """ check if pgos process is alive """
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        """ start pgos process and sample reader thread """
+        if self.verbose:
+            print(' '.join(self.args))
+        self.proc = subprocess.Popen(self.args, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE)
+        self.cgroups = {}
+        reader = Thread(target=self._read_samples, args=(self.proc,))
+        reader.daemon = True
+        reader.start()
+
+    def stop(self):
+        """ stop pgos process, closing stdin lets pgos exit gracefully """
+        if self.is_running():
+            self.proc.stdin.close()
+            self.proc.wait()
+        self.proc = None
+
+    def sync(self, cgroups):
+        """
+        Add new and remove finished cgroups in pgos, restart pgos if needed
+            cgroups - map from container id to perf_event cgroup path
+        """
+        with self.lock:
+            if not self.is_running():
+                self.start()
+            for cid in list(self.cgroups):
+                if cid not in cgroups:
+                    self._send('remove\t' + cid)
+                    del self.cgroups[cid]
+            for cid, path in cgroups.items():
+                if self.cgroups.get(cid) != path:
+                    self._send('add\t' + cid + '\t' + path)
+                    self.cgroups[cid] = path
+
+    def get_sample(self, timeout):
+        """
+        Return lines of the latest complete sample cycle, older cycles are
+        dropped, None is returned if no cycle is ready within timeout
+            timeout - max seconds to wait for one sample cycle
+        """
+        lines = None
+        try:
+            while True:
+                lines = self.samples.get_nowait()
+        except Empty:
+            pass
+        if lines is None:
+            try:
+                lines = self.samples.get(timeout=timeout)
+            except Empty:
+                pass
+        return lines
@@ -0,0 +1,65 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements container thread id lookup based on cgroupfs """
+
+from os.path import join as path_join
+
+
+class PidResolver(object):
+    """
+    This class resolves all thread ids of one cgroup from its tasks file,
+    thread id list is only rebuilt when the tasks file content changes
+    """
+    TASKS_FILES = ('tasks', 'cgroup.threads')
+
+    def __init__(self, cgroup_path):
+        self.cgroup_path = cgroup_path
+        self.tasks_file = None
+        self.content = None
+        self.pids = []
+
+    def _read_tasks(self):
+        if self.tasks_file:
+            with open(self.tasks_file, 'r') as tasksf:
+                return tasksf.read()
+        for name in PidResolver.TASKS_FILES:
+            filename = path_join(self.cgroup_path, name)
+            try:
+                with open(filename, 'r') as tasksf:
+                    content = tasksf.read()
+                self.tasks_file = filename
+                return content
+            except IOError:
+                continue
+        raise IOError('no tasks file in cgroup ' + self.cgroup_path)
+
+    def resolve(self):
+        """
+        Resolve thread ids of cgroup, return tuple of thread id list and
+        if the list changed since last call
+        """
+        try:
+            content = self._read_tasks()
+        except IOError:
+            self.tasks_file = None
+            content = ''
+        if content == self.content:
+            return self.pids, False
+        self.content = content
+        self.pids = content.split()
+        return self.pids, True
@@ -19,7 +19,9 @@
 
 
 
-from prometheus_client import Gauge, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from analyze.cycletimer import BUCKETS
 
 class PrometheusClient:
     def __init__(self):
@@ -34,6 +36,8 @@ class PrometheusClient:
         self.gauge_contention_llc_detected = Gauge('cma_contention_llc_detected', 'Instructions of a container', ["container"])
         self.gauge_contention_other_detected = Gauge('cma_contention_other_detected', 'Instructions of a container', ["container"])
         self.gauge_contention_tdp_detected = Gauge('cma_contention_tdp_detected', 'Instructions of a container', ["container"])
+        self.histogram_cycle_phase_seconds = Histogram('eris_cycle_phase_seconds', 'Latency of one phase of a monitor cycle', ["loop", "phase"], buckets=BUCKETS)
+        self.counter_cycle_missed = Counter('eris_cycle_missed', 'Monitor cycles missed because previous cycle overran its interval', ["loop"])
 
 
     def start(self):
@@ -48,3 +52,9 @@ class PrometheusClient:
         self.gauge_memory_bandwidth.labels(container_name).set(memory_bandwidth)
         self.gauge_llc_occupancy.labels(container_name).set(llc_occupancy)
         self.gauge_llc_occupancy_bytes.labels(container_name).set(llc_occupancy_bytes)
+
+    def send_cycle(self, loop, phases, missed):
+        for phase, seconds in phases:
+            self.histogram_cycle_phase_seconds.labels(loop, phase).observe(seconds)
+        if missed:
+            self.counter_cycle_missed.labels(loop).inc(missed)
@@ -0,0 +1,149 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements buffered recording of csv data files """
+
+from __future__ import print_function
+
+import sys
+import time
+import traceback
+
+from threading import Thread
+try:
+    from queue import Queue, Empty, Full
+except ImportError:
+    from Queue import Queue, Empty, Full
+
+from analyze.columnar import ColumnarWriter
+
+
+class CsvWriter(object):
+    """ This class appends rows to csv data file """
+
+    def __init__(self, filename, columns):
+        self.datf = open(filename, 'w')
+        self.datf.write(','.join(name for name, _ in columns) + '\n')
+
+    def append(self, row):
+        """ append one row """
+        self.datf.write(','.join(str(col) for col in row) + '\n')
+
+    def flush(self, force=False):
+        """ flush written rows to file """
+        self.datf.flush()
+
+    def close(self):
+        """ close data file """
+        self.datf.close()
+
+
+class Recorder(object):
+    """
+    This class queues rows in memory and appends them to data files from a
+    dedicated writer thread, pending rows are flushed when batch size or
+    flush interval is reached, rows are dropped if the queue is full
+    """
+    MAX_PENDING = 100000
+    BATCH_SIZE = 1000
+    FLUSH_INTERVAL = 5
+
+    def __init__(self, max_pending=MAX_PENDING, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
+        self.queue = Queue(max_pending)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.reported = 0
+        self.files = dict()
+        self.writer = None
+
+    def add_file(self, filename, columns, columnar=False):
+        """
+        Create data file, must be called before start
+            filename - data file name
+            columns - list of (column name, column type)
+            columnar - use columnar format instead of csv
+        """
+        if columnar:
+            self.files[filename] = ColumnarWriter(filename, columns)
+        else:
+            self.files[filename] = CsvWriter(filename, columns)
+
+    def start(self):
+        """ start writer thread """
+        self.writer = Thread(target=self._run)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def stop(self):
+        """ flush pending rows, close files and stop writer thread """
+        if self.writer:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def write(self, filename, row):
+        """
+        Queue one row to be appended to data file, never blocks
+            filename - data file name
+            row - list of column values
+        """
+        try:
+            self.queue.put_nowait((filename, row))
+        except Full:
+            self.dropped += 1
+
+    def _flush(self, pending):
+        for filename, datf in self.files.items():
+            rows = pending.get(filename, [])
+            try:
+                for row in rows:
+                    datf.append(row)
+                datf.flush()
+            except (IOError, ValueError):
+                traceback.print_exc(file=sys.stdout)
+            del rows[:]
+        if self.dropped != self.reported:
+            print('recorder dropped %d rows' % (self.dropped - self.reported))
+            self.reported = self.dropped
+
+    def _run(self):
+        pending = dict()
+        count = 0
+        deadline = time.time() + self.flush_interval
+        running = True
+        while running:
+            try:
+                item = self.queue.get(
+                    timeout=max(deadline - time.time(), 0.001))
+                if item is None:
+                    running = False
+                else:
+                    filename, row = item
+                    pending.setdefault(filename, []).append(row)
+                    count += 1
+            except Empty:
+                pass
+            if not running or count >= self.batch_size or\
+               time.time() >= deadline:
+                self._flush(pending)
+                count = 0
+                deadline = time.time() + self.flush_interval
+        for datf in self.files.values():
+            datf.close()
+        self.files = dict()
@@ -0,0 +1,101 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements CLOS group control based on resctrl filesystem """
+
+from __future__ import print_function
+
+import errno
+import os
+
+from os.path import join as path_join
+
+
+class ResctrlGroup(object):
+    """
+    This class manages one resctrl resource group, only tasks not assigned
+    yet are written to tasks file and schemata is only written on change,
+    with CDP enabled the same mask is set for code and data
+    """
+    ROOT = '/sys/fs/resctrl'
+    L3_RESOURCES = ('L3', 'L3CODE', 'L3DATA')
+
+    def __init__(self, name):
+        self.l3_domains = ResctrlGroup._get_l3_domains()
+        if not self.l3_domains:
+            raise OSError(errno.ENOTSUP,
+                          'no L3 cache allocation in resctrl schemata')
+        self.path = path_join(ResctrlGroup.ROOT, name)
+        if not os.path.isdir(self.path):
+            os.mkdir(self.path)
+        self.tasks = set()
+        self.l3_mask = None
+
+    @staticmethod
+    def _get_l3_domains():
+        """
+        List of L3 resource name and its cache ids in root schemata, either
+        L3, or L3CODE and L3DATA if CDP is enabled
+        """
+        domains = []
+        with open(path_join(ResctrlGroup.ROOT, 'schemata')) as schemataf:
+            for line in schemataf:
+                resource, _, doms = line.strip().partition(':')
+                if resource.strip() in ResctrlGroup.L3_RESOURCES:
+                    domains.append((resource.strip(),
+                                    [dom.split('=')[0].strip()
+                                     for dom in doms.split(';')]))
+        return domains
+
+    def add_tasks(self, pids):
+        """
+        Move tasks into group, return number of newly moved tasks
+            pids - all current task ids which belong to group
+        """
+        pids = set(pids)
+        added = set()
+        fd = os.open(path_join(self.path, 'tasks'), os.O_WRONLY)
+        try:
+            for pid in pids - self.tasks:
+                try:
+                    # resctrl accepts only one task id per write
+                    os.write(fd, str(pid).encode('utf-8'))
+                    added.add(pid)
+                except OSError as e:
+                    if e.errno != errno.ESRCH:
+                        raise
+        finally:
+            os.close(fd)
+        self.tasks = (self.tasks & pids) | added
+        return len(added)
+
+    def set_l3_mask(self, mask):
+        """
+        Set L3 cache way mask on all cache domains, return True if schemata
+        is written
+            mask - cache way bitmask as integer
+        """
+        if mask == self.l3_mask:
+            return False
+        lines = ''.join(resource + ':' +
+                        ';'.join('%s=%x' % (cache_id, mask)
+                                 for cache_id in cache_ids) + '\n'
+                        for resource, cache_ids in self.l3_domains)
+        with open(path_join(self.path, 'schemata'), 'w') as schemataf:
+            schemataf.write(lines)
+        self.l3_mask = mask
+        return True
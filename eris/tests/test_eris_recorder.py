@@ -0,0 +1,67 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Background csv recording of eris data files """
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from recorder import Recorder  # noqa: E402
+
+COLUMNS = [('time', None), ('cid', None), ('value', None)]
+
+
+def read_rows(path):
+    with open(path) as datf:
+        return datf.read().splitlines()[1:]
+
+
+def test_rows_dropped_when_queue_full(tmpdir, capsys):
+    path = str(tmpdir.join('metric.csv'))
+    recorder = Recorder(max_pending=2)
+    recorder.add_file(path, COLUMNS)
+    for step in range(5):
+        recorder.write(path, [step, 'a', step * 10])
+    assert recorder.dropped == 3
+
+    recorder.start()
+    recorder.stop()
+    assert read_rows(path) == ['0,a,0', '1,a,10']
+    assert 'recorder dropped 3 rows' in capsys.readouterr().out
+
+
+def test_flush_on_batch_size(tmpdir):
+    path = str(tmpdir.join('metric.csv'))
+    recorder = Recorder(batch_size=2, flush_interval=3600)
+    recorder.add_file(path, COLUMNS)
+    recorder.start()
+    try:
+        recorder.write(path, [0, 'a', 0])
+        time.sleep(0.2)
+        assert read_rows(path) == []
+        recorder.write(path, [1, 'a', 10])
+        deadline = time.time() + 5
+        while not read_rows(path) and time.time() < deadline:
+            time.sleep(0.01)
+        assert read_rows(path) == ['0,a,0', '1,a,10']
+    finally:
+        recorder.stop()
+    assert recorder.dropped == 0
@@ -0,0 +1,137 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Container inventory fed by a fake Docker client """
+
+import os
+import sys
+import time
+from threading import Event
+
+import docker
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from inventory import ContainerInventory  # noqa: E402
+
+
+class FakeContainer(object):
+    def __init__(self, cid):
+        self.id = cid
+
+
+class FakeContainers(object):
+    def __init__(self, client):
+        self.client = client
+        self.running = dict()
+        self.on_list = None
+        self.lists = 0
+
+    def list(self):
+        self.client.calls.append('list')
+        self.lists += 1
+        containers = list(self.running.values())
+        if self.on_list:
+            self.on_list()
+        return containers
+
+    def get(self, cid):
+        if cid not in self.running:
+            raise docker.errors.NotFound(cid)
+        return self.running[cid]
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.calls = []
+        self.containers = FakeContainers(self)
+        self.stream = []
+        self.closed = Event()
+
+    def events(self, decode, filters):
+        self.calls.append('events')
+        if self.stream is None:
+            # later subscriptions wait until test ends
+            self.closed.wait()
+            return iter([])
+        stream, self.stream = self.stream, None
+        return iter(stream)
+
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    yield client
+    client.closed.set()
+
+
+def cids(inventory):
+    return sorted(c.id for c in inventory.list())
+
+
+def wait_for(condition):
+    deadline = time.time() + 5
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_start_and_die_events(client):
+    client.containers.running = {'a': FakeContainer('a'),
+                                 'b': FakeContainer('b')}
+    client.stream = [{'id': 'b', 'Action': 'start'},
+                     {'id': 'a', 'Action': 'die'},
+                     {'id': 'c', 'Action': 'start'},
+                     {'id': 'b', 'status': 'exec_start'}]
+    inventory = ContainerInventory(client)
+    inventory.start()
+
+    # subscribed before listing, so no container is missed in between
+    assert client.calls[:2] == ['events', 'list']
+    assert wait_for(lambda: cids(inventory) == ['b'])
+    assert client.containers.lists == 1
+
+
+def test_event_during_reconcile_not_lost(client):
+    client.containers.running = {'a': FakeContainer('a')}
+    inventory = ContainerInventory(client)
+
+    def die_while_listing():
+        client.containers.running.pop('a')
+        inventory._on_event({'id': 'a', 'Action': 'die'})
+        client.containers.running['b'] = FakeContainer('b')
+        inventory._on_event({'id': 'b', 'Action': 'start'})
+
+    client.containers.on_list = die_while_listing
+    assert inventory.reconcile()
+    assert cids(inventory) == ['b']
+
+
+def test_one_reconcile_at_a_time(client):
+    client.containers.running = {'a': FakeContainer('a')}
+    inventory = ContainerInventory(client, reconcile_interval=0)
+    nested = []
+    client.containers.on_list = lambda: nested.append(inventory.reconcile())
+
+    assert inventory.reconcile()
+    assert nested == [False]
+    assert client.containers.lists == 1
+    client.containers.on_list = None
+    assert cids(inventory) == ['a']
+    assert client.containers.lists == 2
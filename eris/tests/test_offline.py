@@ -0,0 +1,119 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Offline replay of recorded metrics through analyze.py """
+
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+ERIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ERIS_DIR)
+
+from analyze.analyzer import Analyzer, Metric  # noqa: E402
+from analyze.columnar import (ColumnarWriter, FLOAT, INT, STR,  # noqa: E402
+                              TIME)
+
+COLUMNS = [('time', TIME), ('cid', STR), ('name', STR), (Metric.INST, INT),
+           (Metric.CYC, INT), (Metric.CPI, FLOAT), (Metric.L3MPKI, FLOAT),
+           (Metric.L3MISS, INT), (Metric.NF, FLOAT), (Metric.UTIL, FLOAT),
+           (Metric.L3OCC, INT), (Metric.MBL, FLOAT), (Metric.MBR, FLOAT),
+           (Metric.L2STALL, INT), (Metric.MEMSTALL, INT),
+           (Metric.L2SPKI, FLOAT), (Metric.MSPKI, FLOAT)]
+WORKLOADS = ['cassandra', 'django', 'stress']
+
+
+def load_script(name, filename):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(ERIS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_tool(monkeypatch):
+    # eris.py and analyze.py are shadowed by eris and analyze packages,
+    # load them by path
+    monkeypatch.setitem(sys.modules, 'eris', load_script('eris', 'eris.py'))
+    return load_script('analyze_tool', 'analyze.py')
+
+
+def rows():
+    for step in range(6):
+        for index, name in enumerate(WORKLOADS):
+            # every workload grows its LLC occupancy and memory bandwidth,
+            # so each of them is a suspect of the others
+            yield [1500000000.0 + step * 20, 'cid%d' % index, name,
+                   1000000, 3000000, 3.0, 5.0, 5000, 1000.0 - step * 10,
+                   500.0, 1000 * (step + 1) * (index + 1),
+                   100.0 * (index + 1), 10.0, 1000, 1000, 2.0, 2.0]
+
+
+def write_data(tmpdir, columnar):
+    meta = {name: {'cpus': 4, 'type': 'latency_critical'}
+            for name in WORKLOADS}
+    with open(os.path.join(tmpdir, 'workload.json'), 'w') as wlf:
+        wlf.write(json.dumps(meta))
+    # fences low enough that every sample is contended
+    model = {name: {'tdp': {'util': 100.0, 'mean': 2000.0, 'std': 10.0,
+                            'bar': 1970.0},
+                    'thresh': [{'util_start': 0, 'util_end': 1000,
+                                'cpi': 1.0, 'mpki': 1.0, 'mb': 1000.0,
+                                'l2spki': 1.0, 'mspki': 1.0}]}
+             for name in WORKLOADS}
+    model['lcutilmax'] = 1000.0
+    with open(os.path.join(tmpdir, Analyzer.THRESH_FILE), 'w') as threshf:
+        threshf.write(json.dumps(model))
+    with open(os.path.join(tmpdir, Analyzer.UTIL_FILE), 'w') as utilf:
+        utilf.write('time,cid,name,cpu_utilization\n')
+    if columnar:
+        metric_file = Analyzer.METRIC_COL_FILE
+        writer = ColumnarWriter(os.path.join(tmpdir, metric_file), COLUMNS)
+        for row in rows():
+            writer.append(row)
+        writer.close()
+    else:
+        metric_file = Analyzer.METRIC_FILE
+        with open(os.path.join(tmpdir, metric_file), 'w') as metf:
+            metf.write(','.join(name for name, _ in COLUMNS) + '\n')
+            for row in rows():
+                metf.write(','.join(str(col) for col in row) + '\n')
+    return metric_file
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_offline_replay_reports_suspects(tmpdir, monkeypatch, capsys,
+                                         columnar):
+    metric_file = write_data(str(tmpdir), columnar)
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setattr(sys, 'argv', ['analyze.py', 'workload.json', '-o',
+                                      '-m', metric_file, '-n', '2'])
+    load_tool(monkeypatch).main()
+
+    lines = [line for line in capsys.readouterr().out.splitlines()
+             if line.startswith('Contention ')]
+    assert lines
+    for contention in ('LLC', 'MEM_BW', 'TDP'):
+        assert any(contention in line for line in lines)
+    for line in lines:
+        contended = line.split(' for container ')[1].split(':')[0]
+        suspects = line.split('Suspect is ')[1]
+        assert contended not in suspects
+        assert suspects == 'unknown' or suspects.count(' (') <= 2
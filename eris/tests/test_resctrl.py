@@ -0,0 +1,99 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Resctrl resource group control against a fake resctrl root """
+
+import errno
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import resctrl  # noqa: E402
+from resctrl import ResctrlGroup  # noqa: E402
+
+SCHEMATA = '    L3:0=fffff;1=fffff\n    MB:0=100;1=100\n'
+CDP_SCHEMATA = 'L3DATA:0=fffff;1=fffff\nL3CODE:0=fffff;1=fffff\n' +\
+    '    MB:0=100;1=100\n'
+
+
+def make_root(tmpdir, monkeypatch, schemata):
+    tmpdir.join('schemata').write(schemata)
+    tmpdir.mkdir('COS1').join('tasks').write('')
+    monkeypatch.setattr(ResctrlGroup, 'ROOT', str(tmpdir))
+
+
+def read_schemata(tmpdir):
+    return tmpdir.join('COS1', 'schemata').read()
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    # record each write to tasks file, task 13 has exited
+    written = []
+
+    def write(fd, data):
+        if data == b'13':
+            raise OSError(errno.ESRCH, 'no such process')
+        written.append(int(data))
+        return len(data)
+
+    monkeypatch.setattr(resctrl.os, 'write', write)
+    return written
+
+
+def test_add_tasks_writes_only_new_tasks(tmpdir, monkeypatch, writes):
+    make_root(tmpdir, monkeypatch, SCHEMATA)
+    group = ResctrlGroup('COS1')
+
+    assert group.add_tasks([11, 12, 13]) == 2
+    assert sorted(writes) == [11, 12]
+    del writes[:]
+    assert group.add_tasks([12, 14]) == 1
+    assert writes == [14]
+    assert group.tasks == {12, 14}
+
+
+def test_set_l3_mask(tmpdir, monkeypatch):
+    make_root(tmpdir, monkeypatch, SCHEMATA)
+    group = ResctrlGroup('COS1')
+
+    assert group.set_l3_mask(0xf)
+    assert read_schemata(tmpdir) == 'L3:0=f;1=f\n'
+    tmpdir.join('COS1', 'schemata').write('')
+    assert not group.set_l3_mask(0xf)
+    assert read_schemata(tmpdir) == ''
+    assert group.set_l3_mask(0xff0)
+    assert read_schemata(tmpdir) == 'L3:0=ff0;1=ff0\n'
+
+
+def test_set_l3_mask_with_cdp(tmpdir, monkeypatch):
+    make_root(tmpdir, monkeypatch, CDP_SCHEMATA)
+    group = ResctrlGroup('COS1')
+
+    assert group.set_l3_mask(0xf)
+    assert read_schemata(tmpdir) == 'L3DATA:0=f;1=f\nL3CODE:0=f;1=f\n'
+
+
+def test_no_l3_allocation(tmpdir, monkeypatch):
+    make_root(tmpdir, monkeypatch, '    MB:0=100;1=100\n')
+
+    with pytest.raises(OSError):
+        ResctrlGroup('COS1')
@@ -26,10 +26,13 @@ package main
 // int LOG_VER_SUPER_VERBOSE = 2;
 import "C"
 import (
+	"bufio"
 	"flag"
 	"fmt"
+	"io"
 	"os"
 	"strings"
+	"syscall"
 	"time"
 	"unsafe"
 )
@@ -47,6 +50,7 @@ var frequency = flag.Int64("frequency", 5, "sample frequency")
 var period = flag.Int64("period", 1, "sample period")
 var cgroupPath = flag.String("cgroup", "", "cgroups to be monitored")
 var containerIds = flag.String("cids", "", "container id list")
+var stream = flag.Bool("stream", false, "keep monitoring and read cgroup add/remove commands from stdin")
 var metricsDescription = []string{"instructions", "cycles", "LLC misses", "stalls L2 miss", "stalls memory load"}
 
 type PerfCounter struct {
@@ -70,6 +74,8 @@ type Cgroup struct {
 	Leaders     []uintptr
 	Followers   []uintptr
 	PgosHandler C.int
+	Pids        map[C.pid_t]bool `json:"-"`
+	LastPoll    time.Time        `json:"-"`
 }
 
 func NewCgroup(path string, cid string) (*Cgroup, error) {
@@ -105,11 +111,10 @@ func NewCgroup(path string, cid string) (*Cgroup, error) {
 	}, nil
 }
 
-func (this *Cgroup) GetPgosHandler() {
+func (this *Cgroup) readPids() ([]C.pid_t, error) {
 	f, err := os.OpenFile(this.Path+"/tasks", os.O_RDONLY, os.ModePerm)
 	if err != nil {
-		println(err.Error())
-		return
+		return nil, err
 	}
 	defer f.Close()
 	pids := []C.pid_t{}
@@ -121,12 +126,104 @@ func (this *Cgroup) GetPgosHandler() {
 		}
 		pids = append(pids, C.pid_t(pid))
 	}
+	return pids, nil
+}
+
+func (this *Cgroup) startPgos(pids []C.pid_t) {
+	this.Pids = make(map[C.pid_t]bool, len(pids))
+	for _, pid := range pids {
+		this.Pids[pid] = true
+	}
+	if len(pids) == 0 {
+		this.PgosHandler = -1
+		return
+	}
 	this.PgosHandler = C.pgos_mon_start_pids(C.unsigned(len(pids)), (*C.pid_t)(unsafe.Pointer(&pids[0])))
+	this.LastPoll = time.Now()
+}
+
+// PollPgos reads pqos counters of the cgroup and returns LLC occupancy in
+// KB and local and remote memory bandwidth in MB per second, bandwidth is
+// averaged over the time measured since the previous poll, which covers
+// the whole sample cycle rather than only the perf period.
+func (this *Cgroup) PollPgos() (uint64, float64, float64) {
+	value := C.pgos_mon_poll(this.PgosHandler)
+	now := time.Now()
+	elapsed := now.Sub(this.LastPoll).Seconds()
+	this.LastPoll = now
+	llc := uint64(value.llc) / 1024
+	if elapsed <= 0 {
+		return llc, 0, 0
+	}
+	return llc, float64(value.mbm_local_delta) / 1024.0 / 1024.0 / elapsed, float64(value.mbm_remote_delta) / 1024.0 / 1024.0 / elapsed
+}
+
+func (this *Cgroup) GetPgosHandler() {
+	pids, err := this.readPids()
+	if err != nil {
+		println(err.Error())
+		return
+	}
+	this.startPgos(pids)
 
 	return
 }
 
+// RefreshPgosPids rereads the cgroup tasks file and updates the PID set
+// monitored by pqos, so threads spawned after the cgroup was added are
+// monitored as well. The monitor is restarted if its PID set cannot be
+// updated in place.
+func (this *Cgroup) RefreshPgosPids() {
+	pids, err := this.readPids()
+	if err != nil {
+		println(err.Error())
+		return
+	}
+	current := make(map[C.pid_t]bool, len(pids))
+	added := []C.pid_t{}
+	for _, pid := range pids {
+		current[pid] = true
+		if !this.Pids[pid] {
+			added = append(added, pid)
+		}
+	}
+	removed := []C.pid_t{}
+	for pid := range this.Pids {
+		if !current[pid] {
+			removed = append(removed, pid)
+		}
+	}
+	if len(added) == 0 && len(removed) == 0 {
+		return
+	}
+	if this.PgosHandler < 0 || len(pids) == 0 {
+		C.pgos_mon_stop_one(this.PgosHandler)
+		this.startPgos(pids)
+		return
+	}
+	ok := true
+	if len(added) > 0 {
+		ok = C.pgos_mon_add_pids(this.PgosHandler, C.unsigned(len(added)), (*C.pid_t)(unsafe.Pointer(&added[0]))) == 0
+	}
+	if ok && len(removed) > 0 {
+		ok = C.pgos_mon_remove_pids(this.PgosHandler, C.unsigned(len(removed)), (*C.pid_t)(unsafe.Pointer(&removed[0]))) == 0
+	}
+	if !ok {
+		C.pgos_mon_stop_one(this.PgosHandler)
+		this.startPgos(pids)
+		return
+	}
+	this.Pids = current
+}
+
 func (this *Cgroup) Close() error {
+	for _, fd := range this.Followers {
+		syscall.Close(int(fd))
+	}
+	for _, fd := range this.Leaders {
+		syscall.Close(int(fd))
+	}
+	C.pgos_mon_stop_one(this.PgosHandler)
 	err := this.File.Close()
 	if err != nil {
 		return err
@@ -134,6 +231,57 @@ func (this *Cgroup) Close() error {
 	return nil
 }
 
+// readCommands forwards control lines from r to commands and closes the
+// channel once r is exhausted. Supported lines are "add\t<cid>\t<cgroup>"
+// and "remove\t<cid>".
+func readCommands(r io.Reader, commands chan<- string) {
+	scanner := bufio.NewScanner(r)
+	for scanner.Scan() {
+		commands <- scanner.Text()
+	}
+	close(commands)
+}
+
+func removeCgroup(cgroups []*Cgroup, cid string) []*Cgroup {
+	for i, c := range cgroups {
+		if c.Name == cid {
+			c.Close()
+			return append(cgroups[:i], cgroups[i+1:]...)
+		}
+	}
+	return cgroups
+}
+
+// applyCommands drains pending control commands without blocking. It
+// returns false once the command channel is closed.
+func applyCommands(commands <-chan string, cgroups []*Cgroup) ([]*Cgroup, bool) {
+	for {
+		select {
+		case cmd, ok := <-commands:
+			if !ok {
+				return cgroups, false
+			}
+			fields := strings.Split(cmd, "\t")
+			if fields[0] == "add" && len(fields) == 3 {
+				cgroups = removeCgroup(cgroups, fields[1])
+				c, err := NewCgroup(fields[2], fields[1])
+				if err != nil {
+					println(err.Error())
+					continue
+				}
+				c.GetPgosHandler()
+				cgroups = append(cgroups, c)
+			} else if fields[0] == "remove" && len(fields) == 2 {
+				cgroups = removeCgroup(cgroups, fields[1])
+			} else {
+				println("unknown command: " + cmd)
+			}
+		default:
+			return cgroups, true
+		}
+	}
+}
+
 func main() {
 	pqosLog, err := os.OpenFile("/tmp/pqos.log", os.O_CREATE|os.O_WRONLY|os.O_TRUNC, os.ModePerm)
 	if err != nil {
@@ -150,7 +298,10 @@ func main() {
 	C.pqos_init(&config)
 
 	flag.Parse()
-	cgroupsPath := strings.Split(*cgroupPath, ",")
+	cgroupsPath := []string{}
+	if *cgroupPath != "" {
+		cgroupsPath = strings.Split(*cgroupPath, ",")
+	}
 	var conIds = []string{}
 	if *containerIds != "" {
 		conIds = strings.Split(*containerIds, ",")
@@ -180,7 +331,25 @@ func main() {
 		println(err.Error())
 		return
 	}
-	for i := 0; i < *cycle; i++ {
+	var commands chan string
+	if *stream {
+		commands = make(chan string, 64)
+		go readCommands(os.Stdin, commands)
+	}
+	out := bufio.NewWriter(os.Stdout)
+	for i := 0; *stream || i < *cycle; i++ {
+		if *stream {
+			var ok bool
+			cgroups, ok = applyCommands(commands, cgroups)
+			if !ok {
+				break
+			}
+		}
+		if i > 0 {
+			for j := 0; j < len(cgroups); j++ {
+				cgroups[j].RefreshPgosPids()
+			}
+		}
 		now := time.Now().Unix()
 		for j := 0; j < len(cgroups); j++ {
 			for k := 0; k < len(cgroups[j].Leaders); k++ {
@@ -198,15 +367,20 @@ func main() {
 				}
 			}
 			for k := 0; k < len(counters); k++ {
-				fmt.Printf("%s\t%s\t%d\t%+v\n", cgroups[j].Name, metricsDescription[k], now, res[k])
+				fmt.Fprintf(out, "%s\t%s\t%d\t%+v\n", cgroups[j].Name, metricsDescription[k], now, res[k])
 			}
 		}
 		for j := 0; j < len(cgroups); j++ {
-			pgosValue := C.pgos_mon_poll(cgroups[j].PgosHandler)
-			fmt.Printf("%s\t%s\t%d\t%+v\n", cgroups[j].Name, "LLC occupancy", now, pgosValue.llc/1024)
-			fmt.Printf("%s\t%s\t%d\t%+v\n", cgroups[j].Name, "Memory bandwidth local", now, float64(pgosValue.mbm_local_delta)/1024.0/1024.0/float64(*period))
-			fmt.Printf("%s\t%s\t%d\t%+v\n", cgroups[j].Name, "Memory bandwidth remote", now, float64(pgosValue.mbm_remote_delta)/1024.0/1024.0/float64(*period))
+			llc, mbl, mbr := cgroups[j].PollPgos()
+			fmt.Fprintf(out, "%s\t%s\t%d\t%+v\n", cgroups[j].Name, "LLC occupancy", now, llc)
+			fmt.Fprintf(out, "%s\t%s\t%d\t%+v\n", cgroups[j].Name, "Memory bandwidth local", now, mbl)
+			fmt.Fprintf(out, "%s\t%s\t%d\t%+v\n", cgroups[j].Name, "Memory bandwidth remote", now, mbr)
+		}
+		if *stream {
+			// an empty line marks the end of one sample cycle
+			fmt.Fprintln(out)
 		}
+		out.Flush()
 		time.Sleep(fd)
 	}
 	C.pgos_mon_stop()
@@ -93,13 +93,15 @@ func OpenFollower(leader uintptr, cpu uintptr, perfType C.uint32_t, perfConfig C
 	return perfEventOpen(followerAttr, ^uintptr(0), cpu, leader, C.PERF_FLAG_FD_CLOEXEC)
 }
 
+// StartLeader resets and enables the whole event group, so follower
+// counters restart from zero each cycle together with the leader.
 func StartLeader(leader uintptr) {
-	ioctl(leader, C.PERF_EVENT_IOC_RESET, 0)
-	ioctl(leader, C.PERF_EVENT_IOC_ENABLE, 0)
+	ioctl(leader, C.PERF_EVENT_IOC_RESET, C.PERF_IOC_FLAG_GROUP)
+	ioctl(leader, C.PERF_EVENT_IOC_ENABLE, C.PERF_IOC_FLAG_GROUP)
 }
 
 func StopLeader(leader uintptr) {
-	ioctl(leader, C.PERF_EVENT_IOC_DISABLE, 0)
+	ioctl(leader, C.PERF_EVENT_IOC_DISABLE, C.PERF_IOC_FLAG_GROUP)
 }
 
 func ReadLeader(leader uintptr) PerfStruct {
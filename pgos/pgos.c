@@ -25,17 +25,51 @@ typedef struct pqos_mon_data pqos_mon_data;
 typedef struct pqos_event_values pqos_event_values;
 
 struct pqos_mon_data data[MAX_PID_GROUP];
+int used[MAX_PID_GROUP];
 int idx = 0;
 int pgos_mon_start_pids(unsigned pid_num, pid_t *pids) {
-    if (idx >= MAX_PID_GROUP) {
+    int i;
+    for (i = 0; i < idx; i ++) {
+        if (!used[i]) {
+            break;
+        }
+    }
+    if (i >= MAX_PID_GROUP) {
+        return -1;
+    }
+	int ret = pqos_mon_start_pids(pid_num, pids, PQOS_MON_EVENT_L3_OCCUP | PQOS_MON_EVENT_LMEM_BW |PQOS_MON_EVENT_RMEM_BW  , NULL, &data[i]);
+    if (ret != PQOS_RETVAL_OK) {
+        return -1;
+    }
+    used[i] = 1;
+    if (i == idx) {
+        idx ++;
+    }
+    return i;
+}
+
+int pgos_mon_add_pids(int index, unsigned pid_num, pid_t *pids) {
+    if (index < 0 || index >= idx || !used[index]) {
+        return -1;
+    }
+    if (pqos_mon_add_pids(pid_num, pids, &data[index]) != PQOS_RETVAL_OK) {
+        return -1;
+    }
+    return 0;
+}
+
+int pgos_mon_remove_pids(int index, unsigned pid_num, pid_t *pids) {
+    if (index < 0 || index >= idx || !used[index]) {
         return -1;
     }
-	int ret = pqos_mon_start_pids(pid_num, pids, PQOS_MON_EVENT_L3_OCCUP | PQOS_MON_EVENT_LMEM_BW |PQOS_MON_EVENT_RMEM_BW  , NULL, &data[idx]);
-    return idx ++;
+    if (pqos_mon_remove_pids(pid_num, pids, &data[index]) != PQOS_RETVAL_OK) {
+        return -1;
+    }
+    return 0;
 }
 
 struct pqos_event_values pgos_mon_poll(int index) {
-    if (index < 0 || index > idx) {
+    if (index < 0 || index >= idx || !used[index]) {
         pqos_event_values zero_ret;
         memset(&zero_ret, 0, sizeof(pqos_event_values));
         return zero_ret;
@@ -45,9 +79,17 @@ struct pqos_event_values pgos_mon_poll(int index) {
     return data[index].values;
 }
 
+void pgos_mon_stop_one(int index) {
+    if (index < 0 || index >= idx || !used[index]) {
+        return;
+    }
+    pqos_mon_stop(&data[index]);
+    used[index] = 0;
+}
+
 void pgos_mon_stop() {
     int i;
     for (i = 0;i < idx;i ++) {
-        pqos_mon_stop(&data[i]);
+        pgos_mon_stop_one(i);
     }
 }
\ No newline at end of file
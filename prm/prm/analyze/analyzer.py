@@ -20,12 +20,21 @@
 from __future__ import print_function
 import logging
 from enum import Enum
+from multiprocessing import Pool
+from threading import RLock
+import hashlib
 import json
+import os
+import shutil
+import tempfile
 from scipy import stats
 import numpy as np
 import pandas as pd
 
+from .columnar import ColumnarReader, is_columnar, read_frame, _column_name
 from .gmmfense import GmmFense
+from .persist import AsyncFileWriter, write_atomic
+from .threshtable import ThresholdTable
 log = logging.getLogger(__name__)
 
 
@@ -51,11 +60,57 @@ class Metric(str, Enum):
     SYSUTIL = 'system_utilization'
 
 
+def _scalar(value):
+    """ convert numpy scalar to python scalar for model file """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _sample_fense_data(data, sample_cap):
+    """
+    Keep at most sample_cap values of one metric in one utilization bin,
+    values are sorted and split into sample_cap equal quantile strata with
+    one value taken from each, minimum and maximum are always kept, so
+    tails and quantiles of data are preserved
+        data - metric values
+        sample_cap - max number of values kept, all values kept if None
+    """
+    if not sample_cap or len(data) <= sample_cap:
+        return data
+    index = np.round(np.linspace(0, len(data) - 1, sample_cap)).astype(int)
+    return np.sort(data)[index]
+
+
+def _fit_fense(task):
+    """
+    Fit GMM fense of one metric in one utilization bin, runs in worker
+    process in parallel build, None is returned if fit failed
+        task - tuple of data, is_upper, strict, span, verbose, bin label,
+               GmmFense keyword arguments
+    """
+    data, is_upper, strict, span, verbose, label, gmm_args = task
+    try:
+        gmm_fense = GmmFense(data.reshape(-1, 1), **gmm_args)
+        if strict:
+            return gmm_fense.get_strict_fense(is_upper, span).item()
+        return gmm_fense.get_normal_fense(is_upper, span).item()
+    except Exception:
+        if verbose:
+            log.exception('error in build threshold util=%r (%r)', *label)
+        return None
+
+
 class Analyzer:
     UTIL_FILE = 'util.csv'
     METRIC_FILE = 'metric.csv'
+    UTIL_COL_FILE = 'util.prmc'
+    METRIC_COL_FILE = 'metric.prmc'
     THRESH_FILE = 'threshold.json'
+    ONLINE_SUFFIX = '.online.json'
     UTIL_BIN_STEP = 50
+    SAVE_DELAY = 10
+    MODEL_COLUMNS = ['time', 'name', Metric.UTIL, Metric.NF, Metric.CPI,
+                     Metric.L3MPKI, Metric.MB, Metric.MBL, Metric.MBR,
+                     Metric.L2SPKI, Metric.MSPKI]
 
     def __init__(self, wl_file=None, thresh_file=THRESH_FILE):
         if wl_file:
@@ -67,11 +122,21 @@ class Analyzer:
                 raise e
 
         self.thresh_file = thresh_file
+        self.lock = RLock()
+        self.tables = {}
+        # incremented whenever workload thresholds are replaced
+        self.version = 0
+        self.saver = None
         try:
             with open(thresh_file, 'r') as threshf:
                 self.threshold = json.loads(threshf.read())
         except Exception:
             self.threshold = {}
+        # online refitted models of workloads are kept apart, so that model
+        # file always keeps the offline model
+        self.online = {}
+        self.online_file = os.path.splitext(thresh_file)[0] +\
+            Analyzer.ONLINE_SUFFIX
 
     def partition_utilization(self, cpu_number, step=UTIL_BIN_STEP):
         """
@@ -109,20 +174,19 @@ class Analyzer:
                 'std': std,
                 'bar': fbar}
 
-    def _get_fense(self, mdf, is_upper, strict, span, verbose):
-        gmm_fense = GmmFense(mdf.values.reshape(-1, 1), verbose)
-        if strict:
-            return gmm_fense.get_strict_fense(is_upper, span)
-
-        return gmm_fense.get_normal_fense(is_upper, span)
-
-    def _build_thresh(self, jdata, span, strict, verbose):
+    def _plan_thresh(self, jdata, verbose):
+        """
+        Split metrics data of one workload into utilization bins, return
+        workload name and list of (lower bound, higher bound, fense list),
+        each fense is tuple of threshold key, metric data, is_upper
+        """
         job = jdata['name'].values[0]
         cpu_no = self.workload_meta[job]['cpus']
         utilization_partition = self.partition_utilization(
             cpu_no, Analyzer.UTIL_BIN_STEP)
         length = len(utilization_partition)
 
+        bins = []
         for index, util in enumerate(utilization_partition):
             lower_bound = util
             if index != length - 1:
@@ -132,46 +196,82 @@ class Analyzer:
             try:
                 jdataf = jdata[(jdata[Metric.UTIL] >= lower_bound) &
                                (jdata[Metric.UTIL] <= higher_bound)]
-                cpi = jdataf[Metric.CPI]
-                cpi_thresh = self._get_fense(cpi, True, strict,
-                                             span, verbose)
-                mpki = jdataf[Metric.L3MPKI]
-                mpki_thresh = self._get_fense(mpki, True, strict,
-                                              span, verbose)
                 if Metric.MB in jdataf.columns:
                     memb = jdataf[Metric.MB]
                 else:
                     memb = jdataf[Metric.MBL] + jdataf[Metric.MBR]
-                mb_thresh = self._get_fense(memb, False, strict,
-                                            span, verbose)
-                thresh = {
-                    'util_start': lower_bound.item(),
-                    'util_end': higher_bound.item(),
-                    'cpi': cpi_thresh.item(),
-                    'mpki': mpki_thresh.item(),
-                    'mb': mb_thresh.item()
-                }
+                fenses = [('cpi', jdataf[Metric.CPI].values, True),
+                          ('mpki', jdataf[Metric.L3MPKI].values, True),
+                          ('mb', memb.values, False)]
                 if Metric.L2SPKI in jdataf.columns:
-                    l2spki = jdataf[Metric.L2SPKI]
-                    l2spki_thresh = self._get_fense(l2spki, True, strict,
-                                                    span, verbose)
-                    thresh['l2spki'] = l2spki_thresh.item()
+                    fenses.append(('l2spki', jdataf[Metric.L2SPKI].values,
+                                   True))
                 if Metric.MSPKI in jdataf.columns:
-                    mspki = jdataf[Metric.MSPKI]
-                    mspki_thresh = self._get_fense(mspki, True, strict,
-                                                   span, verbose)
-                    thresh['mspki'] = mspki_thresh.item()
-                self.threshold[job]['thresh'].append(thresh)
+                    fenses.append(('mspki', jdataf[Metric.MSPKI].values,
+                                   True))
+                bins.append((lower_bound, higher_bound, fenses))
             except Exception:
                 if verbose:
                     log.exception('error in build threshold util=%r (%r)',
                                   job, util)
+        return job, bins
+
+    def _fit_plans(self, plans, span, strict, verbose, jobs=1,
+                   gmm_args=None, sample_cap=None):
+        """
+        Fit fenses of planned utilization bins and append thresholds in
+        planned order, bins with any failed fit are skipped
+            plans - list of (workload name, bins) from _plan_thresh
+            jobs - number of worker processes, fit serially if 1
+            gmm_args - keyword arguments of GmmFense
+            sample_cap - max values of one metric in one bin used in fit
+        """
+        gmm_args = gmm_args or {}
+        tasks = [(_sample_fense_data(data, sample_cap), is_upper, strict,
+                  span, verbose, (job, lower), gmm_args)
+                 for job, bins in plans
+                 for lower, _, fenses in bins
+                 for _, data, is_upper in fenses]
+        if jobs > 1 and len(tasks) > 1:
+            pool = Pool(jobs)
+            try:
+                results = pool.map(_fit_fense, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_fit_fense(task) for task in tasks]
 
-    def _process_lc_max(self, util_file):
-        udf = pd.read_csv(util_file)
-        lcu = udf[udf['name'] == 'lcs']
-        lcu = udf[Metric.UTIL]
-        maxulc = int(lcu.max())
+        results = iter(results)
+        for job, bins in plans:
+            for lower_bound, higher_bound, fenses in bins:
+                values = [next(results) for _ in fenses]
+                if None in values:
+                    continue
+                thresh = {
+                    'util_start': lower_bound.item(),
+                    'util_end': higher_bound.item(),
+                }
+                for (key, _, _), value in zip(fenses, values):
+                    thresh[key] = value
+                self.threshold[job]['thresh'].append(thresh)
+
+    def _build_thresh(self, jdata, span, strict, verbose, gmm_args=None,
+                      sample_cap=None):
+        self._fit_plans([self._plan_thresh(jdata, verbose)], span, strict,
+                        verbose, gmm_args=gmm_args, sample_cap=sample_cap)
+
+    def _process_lc_max(self, util_file, chunk_rows=None):
+        path = getattr(util_file, 'name', util_file)
+        if chunk_rows and not is_columnar(path):
+            maxulc = int(max(chunk[Metric.UTIL].max() for chunk in
+                             pd.read_csv(util_file, chunksize=chunk_rows,
+                                         usecols=[Metric.UTIL.value])))
+        else:
+            udf = read_frame(util_file, ['name', Metric.UTIL])
+            lcu = udf[udf['name'] == 'lcs']
+            lcu = udf[Metric.UTIL]
+            maxulc = int(lcu.max())
         self.threshold['lcutilmax'] = maxulc
         log.debug('max LC utilization: %f', maxulc)
 
@@ -182,31 +282,229 @@ class Analyzer:
         return self.workload_meta
 
     def update_lcutilmax(self, lc_utils):
-        self.threshold['lcutilmax'] = lc_utils
-        with open(self.thresh_file, 'w') as threshf:
-            threshf.write(json.dumps(self.threshold))
+        """
+        Update max utilization of latency critical workloads in memory, model
+        file is written later on background thread
+            lc_utils - new max utilization
+        """
+        with self.lock:
+            self.threshold['lcutilmax'] = lc_utils
+        self.save_async()
 
-    def get_thresh(self, job):
-        return self.threshold[job]['thresh'] if job in self.threshold else {}
+    def update_thresh(self, job, threshs, tdp=None):
+        """
+        Replace fenses of given utilization bins and TDP threshold in online
+        model of one workload, other bins are kept, thresholds list is
+        replaced as a whole so readers never see a partially updated list,
+        offline model and its fingerprint are kept
+            job - workload name
+            threshs - list of bin thresholds in model file format
+            tdp - TDP threshold in model file format, kept if None
+        """
+        with self.lock:
+            model = self.online.get(job)
+            if model is None:
+                offline = self.threshold.get(job, {})
+                model = {'tdp': offline.get('tdp', {}),
+                         'thresh': offline.get('thresh', [])}
+                self.online[job] = model
+            bins = {thresh['util_start']: thresh
+                    for thresh in model['thresh']}
+            bins.update((thresh['util_start'], thresh) for thresh in threshs)
+            model['thresh'] = [bins[start] for start in sorted(bins)]
+            if tdp is not None:
+                model['tdp'] = tdp
+            self.version += 1
+
+    def _dump(self):
+        with self.lock:
+            return json.dumps(self.threshold)
+
+    def save(self):
+        """ write threshold model to model file """
+        write_atomic(self.thresh_file, self._dump())
+
+    def save_online(self):
+        """ write online refitted models to online model file """
+        with self.lock:
+            content = json.dumps(self.online)
+        write_atomic(self.online_file, content)
+
+    def save_async(self):
+        """
+        Schedule write of threshold model to model file on background thread,
+        updates within SAVE_DELAY seconds are written once with the latest
+        model, pending write is done at exit
+        """
+        with self.lock:
+            if self.saver is None:
+                self.saver = AsyncFileWriter(self.thresh_file,
+                                             Analyzer.SAVE_DELAY)
+        self.saver.submit(self._dump)
+
+    def get_model(self, job, offline=False):
+        """
+        Get threshold model of one workload, online refitted model is
+        preferred, None if workload has no model
+            job - workload name
+            offline - get offline model even if model is refitted online
+        """
+        if not offline and job in self.online:
+            return self.online[job]
+        return self.threshold.get(job)
+
+    def get_models(self):
+        """ list of workload name and threshold model of all workloads """
+        with self.lock:
+            return [(job, self.get_model(job)) for job in self.threshold
+                    if job != 'lcutilmax']
+
+    def get_thresh(self, job, offline=False):
+        model = self.get_model(job, offline)
+        return model['thresh'] if model else {}
+
+    def get_thresh_table(self, job):
+        """
+        Get compiled thresholds of one workload shared by all its containers,
+        table is compiled again only after thresholds are replaced, None if
+        workload has no thresholds
+            job - workload name
+        """
+        threshs = self.get_thresh(job)
+        if not threshs:
+            return None
+        table = self.tables.get(job)
+        if table is None or table.source is not threshs:
+            table = ThresholdTable(threshs)
+            self.tables[job] = table
+        return table
 
-    def get_tdp_thresh(self, job):
-        return self.threshold[job]['tdp'] if job in self.threshold else {}
+    def get_tdp_thresh(self, job, offline=False):
+        model = self.get_model(job, offline)
+        return model['tdp'] if model else {}
+
+    def _iter_spilled_workloads(self, metric_file, chunk_rows):
+        """
+        Read csv metrics file in chunks, append model columns of each
+        workload to its own spill file, then yield workload name and metrics
+        data of one workload at a time
+            metric_file - csv metrics file
+            chunk_rows - number of rows read at once
+        """
+        columns = set(_column_name(c) for c in Analyzer.MODEL_COLUMNS)
+        spill_dir = tempfile.mkdtemp(prefix='prm-model-')
+        try:
+            spills = {}
+            for chunk in pd.read_csv(metric_file, chunksize=chunk_rows,
+                                     usecols=lambda c: c in columns):
+                for cname, jdata in chunk.groupby('name', sort=False):
+                    spill = spills.get(cname)
+                    if spill is None:
+                        spill = os.path.join(spill_dir, '%d.csv' % len(spills))
+                        spills[cname] = spill
+                        jdata.to_csv(spill, index=False)
+                    else:
+                        jdata.to_csv(spill, mode='a', header=False,
+                                     index=False)
+            for cname, spill in spills.items():
+                jdata = pd.read_csv(spill, float_precision='round_trip')
+                os.remove(spill)
+                yield cname, jdata
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    def _iter_workloads(self, metric_file, chunk_rows=None):
+        """
+        Yield workload name and metrics data of each workload, columnar file
+        is read per workload with model columns only
+            metric_file - csv or columnar metrics file
+            chunk_rows - read csv file in chunks of given rows and spill
+                         workloads to disk, whole file is read if None
+        """
+        path = getattr(metric_file, 'name', metric_file)
+        if is_columnar(path):
+            reader = ColumnarReader(path)
+            try:
+                for cname in reader.strings('name'):
+                    yield cname, reader.read(Analyzer.MODEL_COLUMNS,
+                                             names=[cname])
+            finally:
+                reader.close()
+        elif chunk_rows:
+            for cname, jdata in self._iter_spilled_workloads(metric_file,
+                                                             chunk_rows):
+                yield cname, jdata
+        else:
+            mdf = pd.read_csv(metric_file)
+            for cname in mdf['name'].unique():
+                yield cname, mdf[mdf['name'] == cname]
+
+    @staticmethod
+    def _fingerprint(jdata, params):
+        """
+        Fingerprint metrics data of one workload with row count, time range
+        and hash of model columns, together with build parameters
+            jdata - metrics data of one workload
+            params - build parameters which affect fitted thresholds
+        """
+        columns = [c for c in (_column_name(c) for c in Analyzer.MODEL_COLUMNS)
+                   if c in jdata.columns]
+        digest = hashlib.sha1(pd.util.hash_pandas_object(
+            jdata[columns], index=False).values.tobytes())
+        fingerprint = {'rows': len(jdata), 'hash': digest.hexdigest(),
+                       'params': params}
+        if 'time' in jdata.columns and len(jdata):
+            times = jdata['time']
+            fingerprint['time_start'] = _scalar(times.min())
+            fingerprint['time_end'] = _scalar(times.max())
+        return fingerprint
 
     def build_model(self, util_file=UTIL_FILE, metric_file=METRIC_FILE,
-                    span=4, strict=True, verbose=False):
-        if self.threshold:
+                    span=4, strict=True, verbose=False, jobs=1,
+                    patience=None, warm_start=False, chunk_rows=None,
+                    sample_cap=None, incremental=False):
+        """
+        Build threshold model from recorded data and write it to model file,
+        model is only built if no model is loaded unless incremental is set,
+        in which case only workloads whose recorded data or build parameters
+        changed since last build, or new workloads, are refitted
+        """
+        if self.threshold and not incremental:
             return
 
-        self._process_lc_max(util_file)
-        mdf = pd.read_csv(metric_file)
-        cnames = mdf['name'].unique()
-        for cname in cnames:
-            self.threshold[cname] = {"tdp": {}, "thresh": []}
-            jdata = mdf[mdf['name'] == cname]
+        gmm_args = dict(patience=patience, warm_start=warm_start)
+        params = dict(span=span, strict=strict, patience=patience,
+                      warm_start=warm_start, sample_cap=sample_cap)
+        self._process_lc_max(util_file, chunk_rows)
+        wl_meta = self.get_wl_meta()
+        plans = []
+        for cname, jdata in self._iter_workloads(metric_file, chunk_rows):
+            params['cpus'] = wl_meta[cname]['cpus']
+            fingerprint = self._fingerprint(jdata, dict(params))
+            model = self.threshold.get(cname)
+            if model and model.get('fingerprint') == fingerprint:
+                if verbose:
+                    log.info('workload %s unchanged, keep model', cname)
+                continue
+            self.threshold[cname] = {"tdp": {}, "thresh": [],
+                                     "fingerprint": fingerprint}
+            self.online.pop(cname, None)
             self._build_tdp_thresh(jdata)
-            self._build_thresh(jdata, span, strict, verbose)
+            if jobs > 1 and chunk_rows:
+                # fit bins of one workload in parallel, so that data of
+                # only one workload is kept in memory
+                self._fit_plans([self._plan_thresh(jdata, verbose)], span,
+                                strict, verbose, jobs, gmm_args, sample_cap)
+            elif jobs > 1:
+                plans.append(self._plan_thresh(jdata, verbose))
+            else:
+                self._build_thresh(jdata, span, strict, verbose, gmm_args,
+                                   sample_cap)
+        if plans:
+            self._fit_plans(plans, span, strict, verbose, jobs, gmm_args,
+                            sample_cap)
 
+        self.version += 1
         if verbose:
             log.info(self.threshold)
-        with open(self.thresh_file, 'w') as threshf:
-            threshf.write(json.dumps(self.threshold))
+        self.save()
@@ -0,0 +1,334 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module implements compact columnar data file format for recorded
+utilization and metrics data.
+
+A file starts with MAGIC followed by records, every record has a 16 bytes
+header (kind, reserved, payload size) and a payload padded to 8 bytes:
+    SCHEMA     - json list of [column name, column type]
+    DICTIONARY - json list of strings appended to string dictionary
+    CHUNK      - row count followed by fixed width column arrays
+String columns are stored as int32 codes into the string dictionary shared
+by all string columns, time columns are stored as float64 epoch seconds.
+"""
+
+import json
+import logging
+import os
+import struct
+import time as _time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'PRMCOL01'
+SCHEMA = 1
+DICTIONARY = 2
+CHUNK = 3
+
+INT = 'i8'
+FLOAT = 'f8'
+STR = 'str'
+TIME = 'time'
+DTYPES = {
+    INT: np.dtype('<i8'),
+    FLOAT: np.dtype('<f8'),
+    STR: np.dtype('<i4'),
+    TIME: np.dtype('<f8'),
+}
+
+_HEADER = struct.Struct('<IIQ')
+_ROWS = struct.Struct('<Q')
+_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S')
+
+
+def _pad(size):
+    return (size + 7) & ~7
+
+
+def _column_name(name):
+    return getattr(name, 'value', name)
+
+
+def _to_seconds(value):
+    if isinstance(value, datetime):
+        return _time.mktime(value.timetuple()) + value.microsecond / 1e6
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    value = value.replace('T', ' ')
+    for fmt in _TIME_FORMATS:
+        try:
+            return _to_seconds(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError('unknown time format: %r' % value)
+
+
+def is_columnar(path):
+    """ check if given file is in columnar format """
+    try:
+        with open(path, 'rb') as colf:
+            return colf.read(len(MAGIC)) == MAGIC
+    except (IOError, TypeError):
+        return False
+
+
+class ColumnarReader:
+    """
+    This class reads columnar data file through memory mapping, only
+    requested columns and rows are copied out of the mapping
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError('%s is not a columnar data file' % path)
+        self.columns = []
+        self.dictionary = []
+        self.chunks = []
+        self.end = len(MAGIC)
+        self._parse()
+
+    def _parse(self):
+        data = self.data
+        offset = len(MAGIC)
+        while offset + _HEADER.size <= len(data):
+            kind, _, size = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            end = start + _pad(size)
+            if end > len(data):
+                log.warning('truncated record at %d in %s', offset, self.path)
+                break
+            if kind == SCHEMA:
+                self.columns = [tuple(col) for col in
+                                json.loads(bytes(data[start:start + size]))]
+            elif kind == DICTIONARY:
+                self.dictionary.extend(
+                    json.loads(bytes(data[start:start + size])))
+            elif kind == CHUNK:
+                self.chunks.append(self._parse_chunk(start))
+            offset = end
+        self.end = offset
+
+    def _parse_chunk(self, offset):
+        rows, = _ROWS.unpack_from(self.data, offset)
+        offset += _ROWS.size
+        columns = {}
+        for name, ctype in self.columns:
+            dtype = DTYPES[ctype]
+            columns[name] = (offset, dtype)
+            offset += _pad(rows * dtype.itemsize)
+        return rows, columns
+
+    def _view(self, chunk, name):
+        rows, columns = chunk
+        offset, dtype = columns[name]
+        return np.frombuffer(self.data, dtype=dtype, count=rows,
+                             offset=offset)
+
+    def close(self):
+        """ release memory mapping """
+        self.data = None
+
+    def __len__(self):
+        return sum(chunk[0] for chunk in self.chunks)
+
+    def strings(self, column='name'):
+        """
+        List distinct strings of one string column in order of appearance
+            column - string column name
+        """
+        codes = [np.unique(self._view(chunk, column)) for chunk in self.chunks]
+        if not codes:
+            return []
+        codes = pd.unique(np.concatenate(codes))
+        return [self.dictionary[code] for code in codes]
+
+    def read(self, columns=None, names=None, key='name'):
+        """
+        Read columns into DataFrame, missing columns are ignored
+            columns - column names to read, all columns if None
+            names - only rows whose key column is in names are read
+            key - string column used to filter rows by names
+        """
+        types = dict(self.columns)
+        if columns is None:
+            columns = [name for name, _ in self.columns]
+        else:
+            columns = [_column_name(c) for c in columns
+                       if _column_name(c) in types]
+        codes = None
+        if names is not None:
+            index = {s: i for i, s in enumerate(self.dictionary)}
+            codes = np.array([index[n] for n in names if n in index],
+                             dtype=DTYPES[STR])
+        parts = {name: [] for name in columns}
+        for chunk in self.chunks:
+            mask = None
+            if codes is not None:
+                mask = np.isin(self._view(chunk, key), codes)
+                if not mask.any():
+                    continue
+            for name in columns:
+                view = self._view(chunk, name)
+                parts[name].append(view[mask] if mask is not None
+                                   else np.array(view))
+        dictionary = np.array(self.dictionary, dtype=object)
+        frame = {}
+        for name in columns:
+            values = np.concatenate(parts[name]) if parts[name] else\
+                np.array([], dtype=DTYPES[types[name]])
+            if types[name] == STR:
+                values = dictionary[values]
+            frame[name] = values
+        return pd.DataFrame(frame, columns=columns)
+
+
+class ColumnarWriter:
+    """
+    This class appends rows to columnar data file, rows are buffered and
+    written as one chunk when chunk size or chunk age is reached
+    """
+    CHUNK_ROWS = 8192
+    CHUNK_AGE = 60
+
+    def __init__(self, path, columns, chunk_rows=CHUNK_ROWS,
+                 chunk_age=CHUNK_AGE):
+        """
+        Open columnar data file, existing file with the same schema is
+        appended, otherwise a new file is created
+            path - data file path
+            columns - list of (column name, column type)
+            chunk_rows - max rows in one chunk
+            chunk_age - max seconds rows are buffered before written
+        """
+        self.path = path
+        self.columns = [(_column_name(name), ctype)
+                        for name, ctype in columns]
+        self.chunk_rows = chunk_rows
+        self.chunk_age = chunk_age
+        self.codes = {}
+        self.new_strings = []
+        self.rows = []
+        self.first_row_time = 0
+        end = None
+        try:
+            reader = ColumnarReader(path)
+            if reader.columns == self.columns:
+                self.codes = {s: i for i, s in enumerate(reader.dictionary)}
+                end = reader.end
+            reader.close()
+        except (IOError, OSError, ValueError):
+            pass
+        if end is None:
+            self.datf = open(path, 'wb')
+            self.datf.write(MAGIC)
+            self._write_record(SCHEMA, json.dumps(self.columns).encode())
+        else:
+            self.datf = open(path, 'r+b')
+            self.datf.truncate(end)
+            self.datf.seek(end)
+
+    def _write_record(self, kind, payload):
+        self.datf.write(_HEADER.pack(kind, 0, len(payload)))
+        self.datf.write(payload)
+        self.datf.write(b'\0' * (_pad(len(payload)) - len(payload)))
+
+    def _encode(self, value):
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.codes)
+            self.codes[value] = code
+            self.new_strings.append(value)
+        return code
+
+    def append(self, row):
+        """
+        Append one row, values are in schema column order
+            row - list of column values
+        """
+        if not self.rows:
+            self.first_row_time = _time.time()
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_rows:
+            self.flush(True)
+
+    def flush(self, force=False):
+        """
+        Write buffered rows as one chunk if chunk age is reached
+            force - write buffered rows regardless of chunk age
+        """
+        if not self.rows:
+            return
+        if not force and\
+           _time.time() - self.first_row_time < self.chunk_age:
+            return
+        rows = len(self.rows)
+        arrays = []
+        for index, (_, ctype) in enumerate(self.columns):
+            if ctype == STR:
+                values = [self._encode(row[index]) for row in self.rows]
+            elif ctype == TIME:
+                values = [_to_seconds(row[index]) for row in self.rows]
+            else:
+                values = [row[index] for row in self.rows]
+            arrays.append(np.array(values, dtype=DTYPES[ctype]))
+        if self.new_strings:
+            self._write_record(DICTIONARY,
+                               json.dumps(self.new_strings).encode())
+            self.new_strings = []
+        payload = [_ROWS.pack(rows)]
+        for array in arrays:
+            data = array.tobytes()
+            payload.append(data + b'\0' * (_pad(len(data)) - len(data)))
+        self._write_record(CHUNK, b''.join(payload))
+        self.datf.flush()
+        self.rows = []
+
+    def close(self):
+        """ write buffered rows and close data file """
+        self.flush(True)
+        self.datf.close()
+
+
+def read_frame(source, columns=None):
+    """
+    Read csv or columnar data file into DataFrame, missing columns are
+    ignored
+        source - file path or file object
+        columns - column names to read, all columns if None
+    """
+    path = getattr(source, 'name', source)
+    if is_columnar(path):
+        reader = ColumnarReader(path)
+        try:
+            return reader.read(columns)
+        finally:
+            reader.close()
+    if columns is None:
+        return pd.read_csv(source)
+    columns = set(_column_name(c) for c in columns)
+    return pd.read_csv(source, usecols=lambda c: c in columns)
@@ -0,0 +1,61 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements per cycle ranking of contender suspects """
+
+import numpy as np
+
+
+class ContenderIndex(object):
+    """
+    This class ranks all containers once per cycle by their usage score of
+    each contended resource, only containers with positive score are
+    suspects, containers with equal score keep their given order
+    """
+
+    def __init__(self, ids, scores):
+        """
+        Rank containers of current cycle, arguments include:
+            ids - list of container ids
+            scores - mapping from resource to list of container scores in
+                     the same order as ids
+        """
+        self.ranks = dict()
+        for resource, values in scores.items():
+            values = np.asarray(values, dtype=np.float64)
+            with np.errstate(invalid='ignore'):
+                order = np.argsort(-values, kind='mergesort')
+                order = order[values[order] > 0]
+            self.ranks[resource] = [(ids[index], values[index].item())
+                                    for index in order]
+
+    def top(self, resource, exclude, count=1):
+        """
+        Return list of (container id, score) of top suspects of resource
+        contention in descending score order
+            resource - contended resource
+            exclude - id of contended container
+            count - max number of suspects
+        """
+        suspects = []
+        for cid, score in self.ranks.get(resource, []):
+            if cid == exclude:
+                continue
+            suspects.append((cid, score))
+            if len(suspects) == count:
+                break
+        return suspects
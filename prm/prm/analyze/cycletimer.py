@@ -0,0 +1,100 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements per phase latency measurement of monitor cycles """
+
+import time
+from bisect import bisect_left
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+TOTAL = 'total'
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class CycleTimer(object):
+    """
+    This class measures latency of each phase of one monitor cycle, phases
+    are marked in order and a phase lasts from previous mark, durations of
+    last cycle are kept and all durations are counted in fixed bucket
+    histograms, a cycle longer than interval is counted as overrun
+    """
+
+    def __init__(self, loop, interval=0, buckets=BUCKETS):
+        """
+        Class constructor, arguments include:
+            loop - name of monitor loop
+            interval - expected cycle interval in seconds, 0 if unknown
+            buckets - ascending histogram bucket upper bounds in seconds
+        """
+        self.loop = loop
+        self.interval = interval
+        self.buckets = buckets
+        self.phases = []
+        self.counts = dict()
+        self.sums = dict()
+        self.overruns = 0
+        self.begin = 0
+        self.last = 0
+
+    def start(self):
+        """ start one cycle """
+        self.phases = []
+        self.begin = self.last = _clock()
+
+    def mark(self, phase):
+        """
+        End current phase
+            phase - name of phase ending now
+        """
+        now = _clock()
+        self._observe(phase, now - self.last)
+        self.last = now
+
+    def finish(self):
+        """ end cycle, return True if cycle overran interval """
+        total = _clock() - self.begin
+        self._observe(TOTAL, total)
+        overrun = bool(self.interval) and total > self.interval
+        if overrun:
+            self.overruns += 1
+        return overrun
+
+    def _observe(self, phase, seconds):
+        self.phases.append((phase, seconds))
+        counts = self.counts.get(phase)
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+            self.counts[phase] = counts
+            self.sums[phase] = 0.0
+        counts[bisect_left(self.buckets, seconds)] += 1
+        self.sums[phase] += seconds
+
+    def histogram(self, phase):
+        """
+        Return cumulative bucket counts of one phase as list of (upper
+        bound, count), last bound is '+Inf', and sum of durations
+            phase - name of phase
+        """
+        counts = self.counts.get(phase, [0] * (len(self.buckets) + 1))
+        cumulative = []
+        count = 0
+        for bound, value in zip(list(self.buckets) + ['+Inf'], counts):
+            count += value
+            cumulative.append((bound, count))
+        return cumulative, self.sums.get(phase, 0.0)
@@ -0,0 +1,100 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module implements contention detection of all containers in one cycle
+in a single vectorized pass
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+Detection = namedtuple('Detection', ['bins', 'llc', 'mem_bw', 'unkn', 'tdp'])
+
+
+class FleetDetector(object):
+    """
+    This class keeps metrics of all containers of current cycle in one
+    column array per metric and applies threshold rules to all of them at
+    once, rows are evaluated per workload threshold table, a rule with NaN
+    metric or threshold never fires
+    """
+    COLUMNS = ['util', 'cpi', 'mpki', 'mb', 'mspki', 'nf', 'tdp_util',
+               'tdp_bar']
+    CAPACITY = 256
+
+    def __init__(self, capacity=CAPACITY):
+        self.data = np.empty((len(FleetDetector.COLUMNS), capacity))
+        self.tables = []
+
+    def __len__(self):
+        return len(self.tables)
+
+    def reset(self):
+        """ remove all rows, called at start of each cycle """
+        self.tables = []
+
+    def add(self, table, tdp, util, cpi, mpki, mb, nf, mspki=np.nan):
+        """
+        Add metrics of one container, return row index
+            table - ThresholdTable of container workload, None if no model
+            tdp - TDP threshold in model file format, empty if no model
+            util, cpi, mpki, mb, nf - current container metrics
+            mspki - memory stalls per kilo instructions, NaN if not measured
+        """
+        row = len(self.tables)
+        if row == self.data.shape[1]:
+            self.data = np.hstack([self.data, np.empty_like(self.data)])
+        if tdp:
+            tdp_util, tdp_bar = tdp['util'], tdp['bar']
+        else:
+            tdp_util, tdp_bar = np.nan, np.nan
+        self.data[:, row] = (util, cpi, mpki, mb, mspki, nf, tdp_util,
+                             tdp_bar)
+        self.tables.append(table)
+        return row
+
+    def detect(self):
+        """
+        Evaluate contention rules on all rows, return Detection of bin index
+        (-1 if no bin) and boolean array of each contention type
+        """
+        count = len(self.tables)
+        util, cpi, mpki, mb, mspki, nf, tdp_util, tdp_bar =\
+            self.data[:, :count]
+        bins = np.full(count, -1, dtype=np.intp)
+        fenses = np.full((count, 5), np.nan)
+        groups = dict()
+        for row, table in enumerate(self.tables):
+            if table:
+                groups.setdefault(id(table), (table, []))[1].append(row)
+        for table, rows in groups.values():
+            rows = np.array(rows)
+            index = table.find(util[rows])
+            found = index >= 0
+            rows = rows[found]
+            bins[rows] = index[found]
+            fenses[rows] = table.fenses[index[found]]
+
+        with np.errstate(invalid='ignore'):
+            cpi_hit = cpi > fenses[:, 0]
+            llc = cpi_hit & (mpki > fenses[:, 1])
+            mem_bw = cpi_hit & ((mb < fenses[:, 2]) | (mspki > fenses[:, 4]))
+            unkn = cpi_hit & ~llc & ~mem_bw
+            tdp = (util >= tdp_util) & (nf < tdp_bar)
+        return Detection(bins, llc, mem_bw, unkn, tdp)
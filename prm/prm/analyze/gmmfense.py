@@ -28,32 +28,62 @@ log = logging.getLogger(__name__)
 class GmmFense:
     """ This class implements GMM fense build and related retrieve methods """
 
-    def __init__(self, data, max_mixture=10, threshold=0.1):
+    def __init__(self, data, max_mixture=10, threshold=0.1, patience=None,
+                 warm_start=False):
         """
         Class constructor, arguments include:
             data - data to build GMM model
             max_mixture - max number of Gaussian mixtures
             threshold - probability threhold to determine fense
+            patience - stop search once BIC is not improved for this many
+                       consecutive component counts, None to search all
+            warm_start - initialize each fit from previous fit parameters
         """
         self.data = data
         self.thresh = threshold
         lowest_bic = np.infty
         components = 1
         bic = []
+        gmm = None
         n_components_range = range(1, max_mixture + 1)
         for n_components in n_components_range:
             # Fit a Gaussian mixture with EM
-            gmm = mixture.GaussianMixture(n_components=n_components,
-                                          random_state=1005)
+            if warm_start and gmm is not None:
+                gmm = self.__grow_gmm(gmm, data)
+            else:
+                gmm = mixture.GaussianMixture(n_components=n_components,
+                                              random_state=1005)
             gmm.fit(data)
             bic.append(gmm.bic(data))
             if bic[-1] < lowest_bic:
                 lowest_bic = bic[-1]
                 best_gmm = gmm
                 components = n_components
+            elif patience and n_components - components >= patience:
+                break
         log.debug('best gmm components number: %d, bic %f ', components, lowest_bic)
         self.gmm = best_gmm
 
+    @staticmethod
+    def __grow_gmm(gmm, data):
+        """
+        Build a GMM with one more component initialized from fitted gmm,
+        the new component is centered on the least likely data point
+            gmm - fitted GMM
+            data - data to build GMM model
+        """
+        n_components = gmm.n_components + 1
+        new_mean = data[np.argmin(gmm.score_samples(data))]
+        new_precision = 1.0 / max(np.var(data, axis=0)[0], 1e-6)
+        weights = np.append(gmm.weights_ * gmm.n_components / n_components,
+                            1.0 / n_components)
+        return mixture.GaussianMixture(
+            n_components=n_components, random_state=1005,
+            weights_init=weights / weights.sum(),
+            means_init=np.vstack([gmm.means_, new_mean]),
+            precisions_init=np.append(gmm.precisions_,
+                                      [[[new_precision]]], axis=0))
+
     def __get_fense(self, is_upper, span=3):
         """
         Get fense turple based on predefined probability threshold
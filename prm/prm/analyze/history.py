@@ -0,0 +1,81 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements fixed size metrics history of one container """
+
+import numpy as np
+
+
+class MetricHistory(object):
+    """
+    This class keeps most recent samples of a few metrics in a preallocated
+    ring buffer with running sums, so delta of latest sample to average of
+    previous samples is computed in constant time, running sums are
+    recomputed each time the buffer wraps to bound rounding error
+    """
+
+    def __init__(self, columns, depth):
+        """
+        Class constructor, arguments include:
+            columns - number of metrics in one sample
+            depth - max number of samples kept
+        """
+        self.data = np.zeros((depth, columns))
+        self.sums = np.zeros(columns)
+        self.depth = depth
+        self.head = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, values):
+        """
+        Add one sample, the oldest sample is dropped if history is full
+            values - sequence of metric values in column order
+        """
+        row = self.data[self.head]
+        if self.length == self.depth:
+            self.sums -= row
+        else:
+            self.length += 1
+        row[:] = values
+        self.sums += row
+        self.head += 1
+        if self.head == self.depth:
+            self.head = 0
+            self.sums = self.data[:self.length].sum(axis=0)
+
+    def latest(self, column):
+        """
+        Latest value of one metric, 0 if history is empty
+            column - metric column index
+        """
+        if self.length == 0:
+            return 0
+        return self.data[self.head - 1, column]
+
+    def delta(self, column):
+        """
+        Delta of latest value of one metric to average of previous values,
+        latest value if only one sample is kept, 0 if history is empty
+            column - metric column index
+        """
+        if self.length < 2:
+            return self.latest(column)
+        latest = self.data[self.head - 1, column]
+        return latest - (self.sums[column] - latest) / (self.length - 1)
@@ -0,0 +1,253 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+This module implements online threshold model update from metrics samples
+collected while detecting, so thresholds follow workload drift without
+rebuilding the model from all recorded data.
+"""
+
+from __future__ import division
+
+import logging
+import math
+from collections import deque
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+from .analyzer import Metric, _fit_fense
+
+log = logging.getLogger(__name__)
+
+FENSES = [('cpi', True), ('mpki', True), ('mb', False), ('l2spki', True),
+          ('mspki', True)]
+
+
+def _bound(value, offline, drift):
+    return min(max(value, offline * (1 - drift)), offline * (1 + drift))
+
+
+class OnlineBin(object):
+    """
+    This class keeps latest metrics samples of one workload in one
+    utilization bin of offline model, fenses of the bin are refitted from
+    these samples only
+    """
+
+    def __init__(self, offline, keys, window):
+        self.lower = offline['util_start']
+        self.higher = offline['util_end']
+        self.offline = offline
+        self.keys = keys
+        self.samples = deque([], window)
+        self.fresh = 0
+
+
+class OnlineTdp(object):
+    """
+    This class keeps running mean and variance of normalized frequency
+    sampled at high utilization of one workload, seeded with offline TDP
+    threshold weighted as given number of samples
+    """
+
+    def __init__(self, offline, weight):
+        self.offline = offline
+        self.util = offline['util']
+        self.count = weight
+        self.mean = offline['mean']
+        self.m2 = offline['std'] ** 2 * weight
+        self.fresh = 0
+
+    def add(self, freq):
+        """ add one normalized frequency sample """
+        self.count += 1
+        delta = freq - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (freq - self.mean)
+        self.fresh += 1
+
+    def get_thresh(self, drift):
+        """
+        TDP threshold in model file format, bar is bounded by offline bar
+            drift - max fraction bar differs from offline bar
+        """
+        std = math.sqrt(self.m2 / self.count)
+        return {'util': self.util, 'mean': self.mean, 'std': std,
+                'bar': _bound(self.mean - 3 * std, self.offline['bar'],
+                              drift)}
+
+
+class OnlineModel(object):
+    """
+    This class updates threshold model of analyzer online, samples are kept
+    per workload and utilization bin in bounded windows, fenses of a bin are
+    refitted once enough new samples are added, so the cost of one update
+    depends on window size instead of recorded history length, only bins
+    and TDP thresholds of offline model are refitted, each bounded within
+    max_drift of its offline value
+    """
+    WINDOW = 2000
+    MIN_SAMPLES = 100
+    REFRESH_SAMPLES = 50
+    REFRESH_INTERVAL = 300
+    MAX_DRIFT = 0.1
+
+    def __init__(self, analyzer, window=WINDOW, min_samples=MIN_SAMPLES,
+                 refresh_samples=REFRESH_SAMPLES,
+                 refresh_interval=REFRESH_INTERVAL, max_drift=MAX_DRIFT,
+                 span=4, strict=True, verbose=False, gmm_args=None):
+        """
+        Class constructor, arguments include:
+            analyzer - analyzer whose threshold model is updated
+            window - max samples kept per utilization bin
+            min_samples - min samples in a bin before its fenses are fitted
+            refresh_samples - new samples in a bin before fenses are refitted
+            refresh_interval - seconds between refresh in background thread
+            max_drift - max fraction a refitted threshold differs from its
+                        offline value
+            span, strict - fense arguments same as in model build
+            gmm_args - keyword arguments of GmmFense
+        """
+        self.analyzer = analyzer
+        self.window = window
+        self.min_samples = min_samples
+        self.refresh_samples = refresh_samples
+        self.refresh_interval = refresh_interval
+        self.max_drift = max_drift
+        self.span = span
+        self.strict = strict
+        self.verbose = verbose
+        self.gmm_args = gmm_args or {}
+        self.bins = dict()
+        self.tdps = dict()
+        self.version = 0
+        self.lock = Lock()
+        self.stopped = Event()
+        self.updater = None
+
+    def _get_bins(self, job, metrics):
+        bins = self.bins.get(job)
+        if bins is None:
+            bins = []
+            for offline in self.analyzer.get_thresh(job, offline=True):
+                keys = [key for key, _ in FENSES if key in offline]
+                if Metric.L2SPKI not in metrics and 'l2spki' in keys:
+                    keys.remove('l2spki')
+                if Metric.MSPKI not in metrics and 'mspki' in keys:
+                    keys.remove('mspki')
+                bins.append(OnlineBin(offline, keys, self.window))
+            self.bins[job] = bins
+            tdp = self.analyzer.get_tdp_thresh(job, offline=True)
+            self.tdps[job] = OnlineTdp(tdp, self.min_samples)\
+                if tdp else None
+        return bins
+
+    def add(self, job, util, metrics):
+        """
+        Add metrics sample of one workload, samples of workloads without
+        offline model are ignored, samples of cycles in which workload is
+        contended should not be added
+            job - workload name
+            util - cpu utilization of workload
+            metrics - MetricRecord of workload
+        """
+        if not self.analyzer.get_model(job, offline=True):
+            return
+        memb = getattr(metrics, 'mb', None)
+        if memb is None:
+            memb = metrics.mbl + metrics.mbr
+        values = {'cpi': metrics.cpi, 'mpki': metrics.l3mpki, 'mb': memb,
+                  'l2spki': getattr(metrics, 'l2spki', None),
+                  'mspki': getattr(metrics, 'mspki', None)}
+        with self.lock:
+            for obin in self._get_bins(job, metrics):
+                if obin.lower <= util <= obin.higher:
+                    obin.samples.append([values[key] for key in obin.keys])
+                    obin.fresh += 1
+            tdp = self.tdps[job]
+            if tdp and util >= tdp.util:
+                tdp.add(metrics.nf)
+
+    def _fit_bin(self, job, obin, data):
+        thresh = dict(obin.offline)
+        uppers = dict(FENSES)
+        for index, key in enumerate(obin.keys):
+            value = _fit_fense((data[:, index].copy(), uppers[key],
+                                self.strict, self.span, self.verbose,
+                                (job, obin.lower), self.gmm_args))
+            if value is None:
+                return None
+            thresh[key] = _bound(value, obin.offline[key], self.max_drift)
+        return thresh
+
+    def refresh(self):
+        """
+        Refit fenses of bins with enough new samples, update online model of
+        analyzer and write it to online model file, offline model file is
+        not changed, return list of updated workloads
+        """
+        pending = []
+        tdps = dict()
+        with self.lock:
+            for job, bins in self.bins.items():
+                for obin in bins:
+                    if obin.fresh >= self.refresh_samples and\
+                       len(obin.samples) >= self.min_samples:
+                        pending.append((job, obin, np.array(obin.samples)))
+                        obin.fresh = 0
+                tdp = self.tdps[job]
+                if tdp and tdp.fresh:
+                    tdps[job] = tdp.get_thresh(self.max_drift)
+                    tdp.fresh = 0
+
+        updates = dict()
+        for job, obin, data in pending:
+            thresh = self._fit_bin(job, obin, data)
+            if thresh is not None:
+                updates.setdefault(job, []).append(thresh)
+        jobs = set(updates) | set(tdps)
+        if not jobs:
+            return []
+        for job in jobs:
+            self.analyzer.update_thresh(job, updates.get(job, []),
+                                        tdps.get(job))
+        self.analyzer.save_online()
+        self.version += 1
+        log.debug('online model updated: %r', sorted(jobs))
+        return sorted(jobs)
+
+    def _run(self):
+        while not self.stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                log.exception('error in online model refresh')
+
+    def start(self):
+        """ start background refresh thread """
+        self.stopped.clear()
+        self.updater = Thread(target=self._run)
+        self.updater.daemon = True
+        self.updater.start()
+
+    def stop(self):
+        """ stop background refresh thread """
+        if self.updater:
+            self.stopped.set()
+            self.updater.join()
+            self.updater = None
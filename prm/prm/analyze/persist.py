@@ -0,0 +1,162 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements atomic file persistence on a background thread """
+
+import atexit
+import logging
+import os
+import stat
+import tempfile
+import time
+from threading import Condition, Lock, Thread
+
+log = logging.getLogger(__name__)
+
+
+def _file_mode(path):
+    """
+    Mode of existing file, or default mode of a new file under current
+    umask, temporary files are created with mode 0600 instead
+        path - file path
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def write_atomic(path, content):
+    """
+    Write content to a temporary file in the directory of path and rename
+    it to path, so readers never see a partially written file, mode of an
+    existing file is kept
+        path - destination file path
+        content - string content of file
+    """
+    dirname, basename = os.path.split(os.path.abspath(path))
+    mode = _file_mode(path)
+    fd, tmp = tempfile.mkstemp(prefix='.' + basename + '.', dir=dirname)
+    try:
+        with os.fdopen(fd, 'w') as tmpf:
+            os.fchmod(tmpf.fileno(), mode)
+            tmpf.write(content)
+            tmpf.flush()
+            os.fsync(tmpf.fileno())
+        os.rename(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+class AsyncFileWriter(object):
+    """
+    This class writes content to one file atomically on a background thread,
+    callers only submit content and never block on file I/O, content
+    submitted while a write is pending replaces the pending content, and
+    content equal to the last written content is not written again, content
+    can also be a callable which is called on the background thread to
+    render the latest content just before it is written, pending content
+    is written at exit
+    """
+
+    def __init__(self, path, delay=0):
+        """
+        Class constructor, arguments include:
+            path - destination file path
+            delay - seconds to wait after first submit before writing, so a
+                    burst of submits is written once
+        """
+        self.path = path
+        self.delay = delay
+        self.pending = None
+        self.written = None
+        self.closed = False
+        self.cond = Condition()
+        self.io_lock = Lock()
+        self.worker = None
+        atexit.register(self.close)
+
+    def submit(self, content):
+        """
+        Schedule content to be written, return False if content is already
+        written or pending
+            content - string content of file, or callable returning it
+        """
+        with self.cond:
+            if content == self.written or content == self.pending:
+                return False
+            self.pending = content
+            if self.worker is None:
+                self.worker = Thread(target=self._run)
+                self.worker.daemon = True
+                self.worker.start()
+            self.cond.notify()
+            return True
+
+    def _write_pending(self):
+        # writes are serialized and take latest pending content, so an
+        # older content never replaces a newer one
+        with self.io_lock:
+            with self.cond:
+                content = self.pending
+                self.pending = None
+            if content is None:
+                return
+            try:
+                if callable(content):
+                    content = content()
+                if content == self.written:
+                    return
+                write_atomic(self.path, content)
+            except Exception:
+                log.exception('cannot write %r', self.path)
+                return
+            with self.cond:
+                self.written = content
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pending is None and not self.closed:
+                    self.cond.wait()
+                if self.pending is None:
+                    return
+                deadline = time.time() + self.delay
+                while not self.closed:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+            self._write_pending()
+
+    def flush(self):
+        """ write pending content now in calling thread """
+        self._write_pending()
+
+    def close(self):
+        """ write pending content and stop background thread """
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+            worker = self.worker
+        if worker:
+            worker.join()
+            self.worker = None
+        self.flush()
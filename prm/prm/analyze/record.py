@@ -0,0 +1,84 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements compact metrics record of one container """
+
+from .analyzer import Metric
+
+FIELDS = [('time', 'time'), (Metric.CYC, 'cyc'), (Metric.INST, 'inst'),
+          (Metric.L3MISS, 'l3miss'), (Metric.L3OCC, 'l3occ'),
+          (Metric.MB, 'mb'), (Metric.MBL, 'mbl'), (Metric.MBR, 'mbr'),
+          (Metric.CPI, 'cpi'), (Metric.L3MPKI, 'l3mpki'), (Metric.NF, 'nf'),
+          (Metric.UTIL, 'util'), (Metric.L2STALL, 'l2stall'),
+          (Metric.MEMSTALL, 'memstall'), (Metric.L2SPKI, 'l2spki'),
+          (Metric.MSPKI, 'mspki')]
+SLOTS = dict(FIELDS)
+
+
+class MetricRecord(object):
+    """
+    This class keeps metrics of one container in one cycle as slots, hot
+    paths read and write attributes directly, e.g. record.cpi, while a
+    read-only mapping view keyed by Metric is kept for data files, OWCA
+    metrics and Prometheus, metrics never set are missing from the view
+    """
+    __slots__ = [name for _, name in FIELDS]
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, SLOTS[key])
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, SLOTS[key], value)
+
+    def __contains__(self, key):
+        return key in SLOTS and hasattr(self, SLOTS[key])
+
+    def __bool__(self):
+        return any(hasattr(self, name) for _, name in FIELDS)
+
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
+
+    def __repr__(self):
+        return 'MetricRecord(%r)' % self.as_dict()
+
+    def get(self, key, default=None):
+        """ value of metric, default if not set """
+        return getattr(self, SLOTS[key], default)
+
+    def items(self):
+        """ iterate (Metric, value) of metrics set, in FIELDS order """
+        for key, name in FIELDS:
+            if hasattr(self, name):
+                yield key, getattr(self, name)
+
+    def as_dict(self):
+        """ metrics set as dict keyed by Metric """
+        return dict(self.items())
+
+    def update(self, mapping):
+        """
+        set metrics from mapping
+            mapping - mapping from Metric to value
+        """
+        for key, value in mapping.items():
+            setattr(self, SLOTS[key], value)
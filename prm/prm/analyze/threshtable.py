@@ -0,0 +1,74 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements compiled threshold lookup table of one workload """
+
+from collections import namedtuple
+
+import numpy as np
+
+ThresholdBin = namedtuple('ThresholdBin', ['util_start', 'util_end', 'cpi',
+                                           'mpki', 'mb', 'l2spki', 'mspki'])
+
+
+class ThresholdTable(object):
+    """
+    This class compiles utilization bin thresholds of one workload into
+    arrays of bin edges and fence values, bin of an utilization is found by
+    binary search, fences missing in model file are NaN
+    """
+
+    def __init__(self, threshs):
+        """
+        Compile thresholds of one workload
+            threshs - list of bin thresholds in model file format, sorted
+                      by util_start and not overlapping
+        """
+        self.source = threshs
+        columns = {field: np.array([t.get(field, np.nan) for t in threshs],
+                                   dtype=np.float64)
+                   for field in ThresholdBin._fields}
+        self.starts = columns['util_start']
+        self.ends = columns['util_end']
+        self.fenses = np.column_stack(
+            [columns[field] for field in ThresholdBin._fields[2:]])\
+            if threshs else np.empty((0, len(ThresholdBin._fields) - 2))
+        self.bins = [ThresholdBin(*row) for row in
+                     zip(*[columns[field].tolist()
+                           for field in ThresholdBin._fields])]
+
+    def __len__(self):
+        return len(self.bins)
+
+    def find(self, utils):
+        """
+        Find bin index of utilization, utilization higher than bin end
+        falls into the bin unless next bin starts, -1 if lower than first
+        bin start
+            utils - utilization value or array of values
+        """
+        return np.searchsorted(self.starts, utils, side='right') - 1
+
+    def lookup(self, util):
+        """
+        Find bin thresholds of utilization, None if lower than first bin
+            util - utilization value
+        """
+        index = self.find(util)
+        if index < 0:
+            return None
+        return self.bins[index]
@@ -21,11 +21,12 @@ This module implements resource contention detection on one workload
 
 import logging
 from datetime import datetime
-from collections import deque
 from owca.metrics import Metric as OwcaMetric
 from owca.metrics import Measurements, MetricName
 from owca.detectors import ContendedResource
 from prm.analyze.analyzer import Metric
+from prm.analyze.history import MetricHistory
+from prm.analyze.record import MetricRecord
 
 log = logging.getLogger(__name__)
 
@@ -35,13 +36,21 @@ class Container:
     This class is the abstraction of one task, container metrics and
     contention detection method are encapsulated in this module
     """
+    HISTORY_COLUMNS = {Metric.L3OCC: 0, Metric.NF: 1}
 
     def __init__(self, cid, history_depth=5):
         self.cid = cid
-        self.metrics = dict()
+        self.metrics = MetricRecord()
         self.measurements = None
         self.history_depth = history_depth + 1
-        self.metrics_history = deque([], self.history_depth)
+        self.metrics_history = MetricHistory(
+            len(Container.HISTORY_COLUMNS), self.history_depth)
+        self.app = None
+        self.app_labels = None
+        self.app_metrics = []
+        self.app_slots = dict()
+        self.task_labels = dict(task_id=cid)
+        self.task_slots = dict()
 
     '''
     add metric data to metrics history
@@ -50,25 +59,11 @@ class Container:
     self.historyDepth, the oldest data will be erased
     '''
     def _update_metrics_history(self):
-        self.metrics_history.append(self.metrics.copy())
+        metrics = self.metrics
+        self.metrics_history.append((metrics.l3occ, metrics.nf))
 
     def _get_history_delta_by_Type(self, columnname):
-        length = len(self.metrics_history)
-        if length == 0:
-            return 0
-
-        if length == 1:
-            return self.metrics_history[length - 1][columnname]
-
-        data_sum = 0
-
-        for x in range(length - 1):
-            data_sum = data_sum + self.metrics_history[x][columnname]
-
-        data_delta = self.metrics_history[length - 1][columnname] -\
-            data_sum / (length - 1)
-
-        return data_delta
+        return self.metrics_history.delta(Container.HISTORY_COLUMNS[columnname])
 
     def get_llcoccupany_delta(self):
         return self._get_history_delta_by_Type(Metric.L3OCC)
@@ -77,31 +72,39 @@ class Container:
         return self._get_history_delta_by_Type(Metric.NF)
 
     def get_latest_mbt(self):
-        if Metric.MB not in self.metrics:
-            return 0
-        return self.metrics[Metric.MB]
+        return getattr(self.metrics, 'mb', 0)
 
     def get_metrics(self):
         """ retrieve container platform metrics """
         return self.metrics
 
     def get_owca_metrics(self, app):
-        metrics = []
-        if self.metrics:
-            for met, val in self.metrics.items():
-                label_dict = dict(
-                    task_id=self.cid
-                )
-                if app:
-                    label_dict['application'] = app
-
-                metric = OwcaMetric(
-                    name=met,
-                    value=val,
-                    labels=label_dict
-                )
-                metrics.append(metric)
-        return metrics
+        """
+        encode container metrics as OWCA metrics, metric objects are created
+        once per task and application with their own labels, later calls only
+        update metric values in place and return the same list
+            app - application name of task, None if not labeled
+        """
+        if not self.metrics:
+            return []
+        if self.app_labels is None or app != self.app:
+            self.app = app
+            self.app_labels = dict(task_id=self.cid)
+            if app:
+                self.app_labels['application'] = app
+            self.app_metrics = []
+            self.app_slots = dict()
+        slots = self.app_slots
+        for met, val in self.metrics.items():
+            metric = slots.get(met)
+            if metric is None:
+                metric = OwcaMetric(name=met, value=val,
+                                    labels=dict(self.app_labels))
+                slots[met] = metric
+                self.app_metrics.append(metric)
+            else:
+                metric.value = val
+        return self.app_metrics
 
     def update_measurement(self, timestamp: float, measurements: Measurements):
         """
@@ -109,141 +112,107 @@ class Container:
         """
         if self.measurements:
             metrics = self.metrics
+            last = self.measurements
             delta_t = timestamp - self.timestamp
-            metrics[Metric.CYC] = measurements[MetricName.CYCLES] -\
-                self.measurements[MetricName.CYCLES]
-            metrics[Metric.INST] = measurements[MetricName.INSTRUCTIONS] -\
-                self.measurements[MetricName.INSTRUCTIONS]
-            metrics[Metric.L3MISS] = measurements[MetricName.CACHE_MISSES] -\
-                self.measurements[MetricName.CACHE_MISSES]
-            metrics[Metric.L3OCC] = measurements[MetricName.LLC_OCCUPANCY] / 1024
-            if metrics[Metric.INST] == 0:
-                metrics[Metric.CPI] = 0
-                metrics[Metric.L3MPKI] = 0
+            metrics.cyc = measurements[MetricName.CYCLES] -\
+                last[MetricName.CYCLES]
+            metrics.inst = measurements[MetricName.INSTRUCTIONS] -\
+                last[MetricName.INSTRUCTIONS]
+            metrics.l3miss = measurements[MetricName.CACHE_MISSES] -\
+                last[MetricName.CACHE_MISSES]
+            metrics.l3occ = measurements[MetricName.LLC_OCCUPANCY] / 1024
+            if metrics.inst == 0:
+                metrics.cpi = 0
+                metrics.l3mpki = 0
             else:
-                metrics[Metric.CPI] = metrics[Metric.CYC] /\
-                    metrics[Metric.INST]
-                metrics[Metric.L3MPKI] = metrics[Metric.L3MISS] * 1000 /\
-                    metrics[Metric.INST]
-            metrics[Metric.UTIL] = (measurements[MetricName.CPU_USAGE_PER_TASK]
-                                    - self.measurements[MetricName.CPU_USAGE_PER_TASK])\
-                * 100 / (delta_t * 1e9)
-            metrics[Metric.MB] = (measurements[MetricName.MEM_BW] -
-                                  self.measurements[MetricName.MEM_BW]) /\
-                1024 / 1024 / delta_t
-            if metrics[Metric.UTIL] == 0:
-                metrics[Metric.NF] = 0
+                metrics.cpi = metrics.cyc / metrics.inst
+                metrics.l3mpki = metrics.l3miss * 1000 / metrics.inst
+            metrics.util = (measurements[MetricName.CPU_USAGE_PER_TASK] -
+                            last[MetricName.CPU_USAGE_PER_TASK]) *\
+                100 / (delta_t * 1e9)
+            metrics.mb = (measurements[MetricName.MEM_BW] -
+                          last[MetricName.MEM_BW]) / 1024 / 1024 / delta_t
+            if metrics.util == 0:
+                metrics.nf = 0
             else:
-                metrics[Metric.NF] = metrics[Metric.CYC] / delta_t / 10000 /\
-                    metrics[Metric.UTIL]
+                metrics.nf = metrics.cyc / delta_t / 10000 / metrics.util
             self._update_metrics_history()
 
         self.measurements = measurements
         self.timestamp = timestamp
 
     def _append_metrics(self, metrics, mname, mvalue):
-        metric = OwcaMetric(
-                name=mname,
-                value=mvalue,
-                labels=dict(
-                    task_id=self.cid,
-                )
-            )
+        metric = self.task_slots.get(mname)
+        if metric is None:
+            metric = OwcaMetric(name=mname, value=mvalue,
+                                labels=dict(self.task_labels))
+            self.task_slots[mname] = metric
+        else:
+            metric.value = mvalue
         metrics.append(metric)
 
-    def _detect_in_bin(self, thresh):
+    def get_contention_metrics(self, thresh, cond_res):
+        """
+        log detected contention and encode related metrics as OWCA metrics
+            thresh - thresholds of utilization bin in which it is detected
+            cond_res - list of detected contended resources
+        """
         owca_metrics = []
-        cond_res = []
+        if not cond_res:
+            return owca_metrics
+
         metrics = self.metrics
-        unknown_reason = True
-        if metrics[Metric.CPI] > thresh['cpi']:
-            self._append_metrics(owca_metrics, Metric.CPI,
-                                 metrics[Metric.CPI])
-            self._append_metrics(owca_metrics, 'cpi_threshold', thresh['cpi'])
-
-            if metrics[Metric.L3MPKI] > thresh['mpki']:
-                log.info('Last Level Cache contention is detected:')
-                log.info('Latency critical container %s CPI = %f MPKI = %f \n',
-                         self.cid, metrics[Metric.CPI], metrics[Metric.L3MPKI])
-                self._append_metrics(owca_metrics, Metric.L3MPKI,
-                                     metrics[Metric.L3MPKI])
-                self._append_metrics(owca_metrics, 'mpki_threshold',
-                                     thresh['mpki'])
-                cond_res.append(ContendedResource.LLC)
-                unknown_reason = False
-
-            if metrics[Metric.MB] < thresh['mb']:
-                log.info('Memory Bandwidth contention detected:')
-                log.info('Latency critical container %s CPI = %f MB = %f \n',
-                         self.cid, metrics[Metric.CPI], metrics[Metric.MB])
-                self._append_metrics(owca_metrics, Metric.MB,
-                                     metrics[Metric.MB])
-                self._append_metrics(owca_metrics, 'mb_threshold',
-                                     thresh['mb'])
-                cond_res.append(ContendedResource.MEMORY_BW)
-                unknown_reason = False
-
-            if unknown_reason:
-                log.info('Performance is impacted by unknown reason:')
-                log.info('Latency critical container %s CPI exceeds threshold = %f',
-                         self.cid, metrics[Metric.CPI])
-                cond_res.append(ContendedResource.UNKN)
-
-            return cond_res, owca_metrics
-
-        return [], owca_metrics
-
-    def tdp_contention_detect(self, tdp_thresh):
-        """ detect TDP contention in container """
+        self._append_metrics(owca_metrics, Metric.CPI, metrics.cpi)
+        self._append_metrics(owca_metrics, 'cpi_threshold', thresh.cpi)
+        if ContendedResource.LLC in cond_res:
+            log.info('Last Level Cache contention is detected:')
+            log.info('Latency critical container %s CPI = %f MPKI = %f \n',
+                     self.cid, metrics.cpi, metrics.l3mpki)
+            self._append_metrics(owca_metrics, Metric.L3MPKI,
+                                 metrics.l3mpki)
+            self._append_metrics(owca_metrics, 'mpki_threshold', thresh.mpki)
+        if ContendedResource.MEMORY_BW in cond_res:
+            log.info('Memory Bandwidth contention detected:')
+            log.info('Latency critical container %s CPI = %f MB = %f \n',
+                     self.cid, metrics.cpi, metrics.mb)
+            self._append_metrics(owca_metrics, Metric.MB, metrics.mb)
+            self._append_metrics(owca_metrics, 'mb_threshold', thresh.mb)
+        if ContendedResource.UNKN in cond_res:
+            log.info('Performance is impacted by unknown reason:')
+            log.info('Latency critical container %s CPI exceeds threshold = %f',
+                     self.cid, metrics.cpi)
+        return owca_metrics
+
+    def get_tdp_contention_metrics(self, tdp_thresh, contended):
+        """
+        log TDP contention detection and encode related metrics as OWCA
+        metrics
+            tdp_thresh - TDP threshold of container workload
+            contended - True if TDP contention is detected
+        """
         owca_metrics = []
-        if not tdp_thresh:
-            return None, owca_metrics
-
         metrics = self.metrics
         log.debug('Current utilization = %f, frequency = %f, tdp utilization\
-                  threshold = %f, tdp frequency bar = %f', metrics[Metric.UTIL],
-                  metrics[Metric.NF], tdp_thresh['util'], tdp_thresh['bar'])
-
-        if metrics[Metric.UTIL] >= tdp_thresh['util'] and\
-           self.metrics[Metric.NF] < tdp_thresh['bar']:
+                  threshold = %f, tdp frequency bar = %f', metrics.util,
+                  metrics.nf, tdp_thresh['util'], tdp_thresh['bar'])
+        if contended:
             log.info('TDP Contention Alert!')
-            self._append_metrics(owca_metrics, Metric.NF, metrics[Metric.NF])
+            self._append_metrics(owca_metrics, Metric.NF, metrics.nf)
             self._append_metrics(owca_metrics, 'nf_threshold',
                                  tdp_thresh['bar'])
             self._append_metrics(owca_metrics, Metric.UTIL,
-                                 metrics[Metric.UTIL])
+                                 metrics.util)
             self._append_metrics(owca_metrics, 'util_threshold',
                                  tdp_thresh['util'])
-
-            return ContendedResource.TDP, owca_metrics
-
-        return None, owca_metrics
-
-    def contention_detect(self, threshs):
-        """ detect resouce contention after find proper utilization bin """
-        if not threshs:
-            return [], []
-
-        metrics = self.metrics
-        for i in range(0, len(threshs)):
-            thresh = threshs[i]
-            if metrics[Metric.UTIL] < thresh['util_start']:
-                if i == 0:
-                    return [], []
-
-                return self._detect_in_bin(threshs[i - 1])
-
-            if metrics[Metric.UTIL] >= thresh['util_start']:
-                if metrics[Metric.UTIL] < thresh['util_end'] or i == len(threshs) - 1:
-                    return self._detect_in_bin(thresh)
+        return owca_metrics
 
     def __str__(self):
         metrics = self.metrics
         return datetime.fromtimestamp(self.timestamp).isoformat() + ',' +\
-            self.cid + ',' + str(metrics[Metric.INST]) +\
-            ',' + str(metrics[Metric.CYC]) + ',' +\
-            str(metrics[Metric.CPI]) + ',' + str(metrics[Metric.L3MPKI]) +\
-            ',' + str(metrics[Metric.L3MISS]) + ',' +\
-            str(metrics[Metric.NF]) + ',' + str(metrics[Metric.UTIL]) +\
-            ',' + str(metrics[Metric.L3OCC]) + ',' +\
-            str(metrics[Metric.MB]) + ',' + '\n'
+            self.cid + ',' + str(metrics.inst) +\
+            ',' + str(metrics.cyc) + ',' +\
+            str(metrics.cpi) + ',' + str(metrics.l3mpki) +\
+            ',' + str(metrics.l3miss) + ',' +\
+            str(metrics.nf) + ',' + str(metrics.util) +\
+            ',' + str(metrics.l3occ) + ',' +\
+            str(metrics.mb) + ',' + '\n'
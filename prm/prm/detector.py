@@ -1,6 +1,6 @@
 import logging
 import json
-import numpy as np
+from dataclasses import replace
 from owca import detectors
 from owca.platforms import Platform
 from owca.detectors import ContentionAnomaly, TasksMeasurements
@@ -10,6 +10,12 @@ from owca.metrics import Metric as OwcaMetric
 
 from prm.container import Container
 from prm.analyze.analyzer import Metric, Analyzer
+from prm.analyze.contender import ContenderIndex
+from prm.analyze.cycletimer import CycleTimer
+from prm.analyze.detection import FleetDetector
+from prm.analyze.online import OnlineModel
+from prm.analyze.persist import AsyncFileWriter
+from prm.recorder import Recorder
 
 log = logging.getLogger(__name__)
 
@@ -18,20 +24,49 @@ class ContentionDetector(detectors.AnomalyDetector):
     COLLECT_MODE = 'collect'
     DETECT_MODE = 'detect'
     WL_META_FILE = 'workload.json'
-
-    def __init__(self, mode_config: str = 'collect'):
-        log.debug('Mode config: %s', mode_config)
+    CSV_FORMAT = 'csv'
+    COLUMNAR_FORMAT = 'columnar'
+    SUSPECTS = 3
+
+    def __init__(self, mode_config: str = 'collect',
+                 record_format: str = 'csv', online_model: bool = False,
+                 action_delay: float = 0.):
+        log.debug('Mode config: %s, record format: %s, online model: %s',
+                  mode_config, record_format, online_model)
         self.mode_config = mode_config
+        self.timer = CycleTimer('detect', action_delay)
+        self.overrun_metric = OwcaMetric(name='prm_detect_overrun', value=0)
+        self.cycle_metrics = [self.overrun_metric]
+        self.cycle_slots = dict()
+        self.online = None
+        self.fleet = FleetDetector()
+        self.contender_index = None
+        self.threshold_metrics = None
+        self.threshold_metrics_version = None
+        self.workload_threshold_metrics = ()
+        self.lcutilmax = None
         self.container_map = dict()
         self.ucols = ['time', 'cid', 'name', Metric.UTIL]
         self.mcols = ['time', 'cid', 'name', Metric.CYC, Metric.INST,
                       Metric.L3MISS, Metric.L3OCC, Metric.MB, Metric.CPI,
                       Metric.L3MPKI, Metric.NF, Metric.UTIL]
+        self.recorder = None
+        if record_format == ContentionDetector.COLUMNAR_FORMAT:
+            self.util_file = Analyzer.UTIL_COL_FILE
+            self.metric_file = Analyzer.METRIC_COL_FILE
+        else:
+            self.util_file = Analyzer.UTIL_FILE
+            self.metric_file = Analyzer.METRIC_FILE
         if mode_config == ContentionDetector.COLLECT_MODE:
             self.analyzer = Analyzer()
             self.workload_meta = {}
-            self._init_data_file(Analyzer.UTIL_FILE, self.ucols)
-            self._init_data_file(Analyzer.METRIC_FILE, self.mcols)
+            self.workload_meta_dirty = False
+            self.workload_meta_writer = AsyncFileWriter(
+                ContentionDetector.WL_META_FILE)
+            columnar = record_format == ContentionDetector.COLUMNAR_FORMAT
+            self.recorder = Recorder()
+            self.recorder.add_file(self.util_file, self.ucols, columnar)
+            self.recorder.add_file(self.metric_file, self.mcols, columnar)
         else:
             try:
                 with open(ContentionDetector.WL_META_FILE, 'r') as wlf:
@@ -39,78 +74,117 @@ class ContentionDetector(detectors.AnomalyDetector):
             except Exception as e:
                 log.exception('cannot read workload file - stopped')
                 raise e
-            self.analyzer.build_model()
-
-    def _init_data_file(self, data_file, cols):
-        headline = None
-        try:
-            with open(data_file, 'r') as dtf:
-                headline = dtf.readline()
-        except Exception:
-                log.debug('cannot open %r for reading - ignore', data_file)
-        if headline != ','.join(cols) + '\n':
-            with open(data_file, 'w') as dtf:
-                dtf.write(','.join(cols) + '\n')
+            self.analyzer.build_model(self.util_file, self.metric_file)
+            if online_model:
+                self.online = OnlineModel(self.analyzer)
+                self.online.start()
+
+    def _build_contender_index(self):
+        cids = list(self.container_map)
+        cons = [self.container_map[cid] for cid in cids]
+        return ContenderIndex(cids, {
+            ContendedResource.LLC: [con.get_llcoccupany_delta()
+                                    for con in cons],
+            ContendedResource.MEMORY_BW: [con.get_latest_mbt()
+                                          for con in cons],
+            ContendedResource.TDP: [con.get_freq_delta() for con in cons],
+        })
 
     def _detect_contenders(self, con: Container, resource: ContendedResource):
-        contenders = []
+        """
+        Return ids of top suspects of resource contention and their scores
+        as OWCA metrics, suspects are ranked once per detect call
+        """
         if resource == ContendedResource.UNKN:
-            return contenders
+            return [], []
 
-        resource_delta_max = -np.Inf
-        contender_id = None
-        for cid, container in self.container_map.items():
-            delta = 0
-            if con.cid == container.cid:
-                continue
-            if resource == ContendedResource.LLC:
-                delta = container.get_llcoccupany_delta()
-            elif resource == ContendedResource.MEMORY_BW:
-                delta = container.get_latest_mbt()
-            elif resource == ContendedResource.TDP:
-                delta = container.get_freq_delta()
-
-            if delta > 0 and delta > resource_delta_max:
-                resource_delta_max = delta
-                contender_id = container.cid
-
-        if contender_id:
-            contenders.append(contender_id)
-
-        return contenders
+        if self.contender_index is None:
+            self.contender_index = self._build_contender_index()
+        suspects = self.contender_index.top(resource, con.cid,
+                                            ContentionDetector.SUSPECTS)
+        scores = [OwcaMetric(name='contender_score', value=score,
+                             labels=dict(task_id=con.cid, contender_id=cid))
+                  for cid, score in suspects]
+        return [cid for cid, _ in suspects], scores
 
     def _append_anomaly(self, anomalies, res, cid, contenders, owca_metrics):
+        # OWCA adds anomaly uuid to labels of anomaly metrics in place, so
+        # each anomaly gets its own copies of cached container metrics
         anomaly = ContentionAnomaly(
                 resource=res,
                 contended_task_id=cid,
                 contending_task_ids=contenders,
-                metrics=owca_metrics
+                metrics=[replace(metric, labels=dict(metric.labels))
+                         for metric in owca_metrics]
             )
         anomalies.append(anomaly)
 
-    def _detect_one_task(self, con: Container, app: str):
+    def _detect_one_task(self, con: Container, app: str, row, result,
+                         thresh, thresh_tdp):
         anomalies = []
-        if not con.get_metrics():
-            return anomalies
-
-        analyzer = self.analyzer
         cid = con.cid
-        if app in analyzer.threshold:
-            thresh = analyzer.get_thresh(app)
-            contends, owca_metrics = con.contention_detect(thresh)
+        contends = [res for res, contended in
+                    ((ContendedResource.LLC, result.llc[row]),
+                     (ContendedResource.MEMORY_BW, result.mem_bw[row]),
+                     (ContendedResource.UNKN, result.unkn[row]))
+                    if contended]
+        if contends:
+            owca_metrics = con.get_contention_metrics(
+                thresh.bins[result.bins[row]], contends)
             log.debug('cid=%r contends=%r', cid, contends)
             log.debug('cid=%r threshold metrics=%r', cid, owca_metrics)
             for contend in contends:
-                contenders = self._detect_contenders(con, contend)
+                contenders, scores = self._detect_contenders(con, contend)
                 self._append_anomaly(anomalies, contend, cid, contenders,
-                                     owca_metrics)
-            thresh_tdp = analyzer.get_tdp_thresh(app)
-            tdp_contend, owca_metrics = con.tdp_contention_detect(thresh_tdp)
-            if tdp_contend:
-                contenders = self._detect_contenders(con, tdp_contend)
-                self._append_anomaly(anomalies, tdp_contend, cid, contenders,
-                                     owca_metrics)
+                                     owca_metrics + scores)
+        if thresh_tdp:
+            tdp_contended = result.tdp[row]
+            owca_metrics = con.get_tdp_contention_metrics(thresh_tdp,
+                                                          tdp_contended)
+            if tdp_contended:
+                contenders, scores = self._detect_contenders(
+                    con, ContendedResource.TDP)
+                self._append_anomaly(anomalies, ContendedResource.TDP, cid,
+                                     contenders, owca_metrics + scores)
+
+        return anomalies
+
+    def _detect_tasks(self, tasks_labels: TasksLabels):
+        """
+        Detect contention of all tasks with metrics in one vectorized pass
+        over the fleet detector, anomalies are reported in task order
+        """
+        analyzer = self.analyzer
+        fleet = self.fleet
+        fleet.reset()
+        self.contender_index = None
+        tasks = []
+        for container in self.container_map.values():
+            app = self._cid_to_app(container.cid, tasks_labels)
+            metrics = container.get_metrics()
+            if not app or not metrics:
+                continue
+            if app in analyzer.threshold:
+                thresh = analyzer.get_thresh_table(app)
+                thresh_tdp = analyzer.get_tdp_thresh(app)
+            else:
+                thresh, thresh_tdp = None, {}
+            fleet.add(thresh, thresh_tdp, metrics.util, metrics.cpi,
+                      metrics.l3mpki, metrics.mb, metrics.nf)
+            tasks.append((container, app, thresh, thresh_tdp))
 
+        anomalies = []
+        if tasks:
+            result = fleet.detect()
+            for row, (container, app, thresh, thresh_tdp) in\
+                    enumerate(tasks):
+                task_anomalies = self._detect_one_task(
+                    container, app, row, result, thresh, thresh_tdp)
+                anomalies.extend(task_anomalies)
+                if self.online and not task_anomalies and\
+                   not self._is_be_app(container.cid, tasks_labels):
+                    metrics = container.get_metrics()
+                    self.online.add(app, metrics.util, metrics)
         return anomalies
 
     def _get_container_from_taskid(self, cid):
@@ -148,73 +222,119 @@ class ContentionDetector(detectors.AnomalyDetector):
                 OwcaMetric(name=Metric.LCMAX, value=util_max),
                 OwcaMetric(name=Metric.SYSUTIL, value=sysutil)]
 
+    def _build_threshold_metrics(self):
+        """
+        Encode thresholds of all workloads as OWCA metrics, called only when
+        threshold model is loaded or updated
+        """
+        metrics = []
+        for cid, threshold in self.analyzer.get_models():
+            if 'tdp' in threshold and 'bar' in threshold['tdp']:
+                metrics.extend([
+                    OwcaMetric(
+                        name='threshold_tdp_bar',
+                        value=threshold['tdp']['bar'],
+                        labels=dict(cid=cid)),
+                    OwcaMetric(
+                        name='threshold_tdp_util',
+                        value=threshold['tdp']['util'],
+                        labels=dict(cid=cid)),
+                ])
+            if 'thresh' in threshold:
+                for d in threshold['thresh']:
+                    labels = dict(start=str(int(d['util_start'])),
+                                  end=str(int(d['util_end'])),
+                                  cid=cid)
+                    metrics.extend([
+                        OwcaMetric(name='threshold_cpi', labels=labels,
+                                   value=d['cpi']),
+                        OwcaMetric(name='threshold_mpki', labels=labels,
+                                   value=d['mpki']),
+                        OwcaMetric(name='threshold_mb', labels=labels,
+                                   value=d['mb']),
+                    ])
+        return tuple(metrics)
+
     def _get_threshold_metrics(self):
         """Encode threshold objects as OWCA metrics.
         In contrast to *_threshold metrics from Container,
         all utilization partitions are exposed for all workloads.
+        Metrics are built again only after threshold model version or
+        lcutilmax changes, otherwise the same immutable tuple is returned.
         """
-        metrics = []
         # Only when debugging is enabled.
-        if log.getEffectiveLevel() == logging.DEBUG:
-            for cid, threshold in self.analyzer.threshold.items():
-                if cid == 'lcutilmax':
-                    metrics.append(
-                        OwcaMetric(name='threshold_lcutilmax', value=threshold)
-                    )
-                    continue
-                if 'tdp' in threshold and 'bar' in threshold['tdp']:
-                    metrics.extend([
-                        OwcaMetric(
-                            name='threshold_tdp_bar',
-                            value=threshold['tdp']['bar'],
-                            labels=dict(cid=cid)),
-                        OwcaMetric(
-                            name='threshold_tdp_util',
-                            value=threshold['tdp']['util'],
-                            labels=dict(cid=cid)),
-                    ])
-                if 'thresh' in threshold:
-                    for d in threshold['thresh']:
-                        metrics.extend([
-                            OwcaMetric(
-                                name='threshold_cpi',
-                                labels=dict(start=str(int(d['util_start'])),
-                                            end=str(int(d['util_end'])),
-                                            cid=cid),
-                                value=d['cpi']),
-                            OwcaMetric(
-                                name='threshold_mpki',
-                                labels=dict(start=str(int(d['util_start'])),
-                                            end=str(int(d['util_end'])),
-                                            cid=cid),
-                                value=(d['mpki'])),
-                            OwcaMetric(
-                                name='threshold_mb',
-                                labels=dict(start=str(int(d['util_start'])),
-                                            end=str(int(d['util_end'])),
-                                            cid=cid),
-                                value=(d['mb'])),
-                        ])
-
-        return metrics
+        if log.getEffectiveLevel() != logging.DEBUG:
+            return ()
+        analyzer = self.analyzer
+        version = analyzer.version
+        if version != self.threshold_metrics_version:
+            self.threshold_metrics_version = version
+            self.workload_threshold_metrics = self._build_threshold_metrics()
+            self.threshold_metrics = None
+        lcutilmax = analyzer.threshold.get('lcutilmax')
+        if self.threshold_metrics is None or lcutilmax != self.lcutilmax:
+            self.lcutilmax = lcutilmax
+            metrics = ()
+            if lcutilmax is not None:
+                metrics = (OwcaMetric(name='threshold_lcutilmax',
+                                      value=lcutilmax),)
+            self.threshold_metrics = metrics + self.workload_threshold_metrics
+        return self.threshold_metrics
 
     def _record_utils(self, time, utils):
-        row = [str(time), '', 'lcs']
+        row = [time, '', 'lcs']
         for i in range(3, len(self.ucols)):
-            row.append(str(utils))
-        with open(Analyzer.UTIL_FILE, 'a') as utilf:
-            utilf.write(','.join(row) + '\n')
+            row.append(utils)
+        self.recorder.write(self.util_file, row)
 
     def _record_metrics(self, time, name, cid, metrics):
-        row = [str(time), cid, name if name else '']
+        row = [time, cid, name if name else '']
         for i in range(3, len(self.mcols)):
-            row.append(str(metrics[self.mcols[i]]))
-        with open(Analyzer.METRIC_FILE, 'a') as metricf:
-            metricf.write(','.join(row) + '\n')
+            row.append(metrics[self.mcols[i]])
+        self.recorder.write(self.metric_file, row)
+
+    def _set_workload_meta(self, app, resources):
+        if self.workload_meta.get(app) != resources:
+            self.workload_meta[app] = dict(resources)
+            self.workload_meta_dirty = True
 
     def _update_workload_meta(self):
-        with open(ContentionDetector.WL_META_FILE, 'w') as wlf:
-            wlf.write(json.dumps(self.workload_meta))
+        """
+        Schedule write of workload meta file on background thread, only if
+        workload meta changed since last update
+        """
+        if self.workload_meta_dirty:
+            self.workload_meta_writer.submit(json.dumps(self.workload_meta))
+            self.workload_meta_dirty = False
+
+    def _get_cycle_metrics(self):
+        """
+        Encode latency histogram of each detect phase and count of detect
+        calls longer than action delay as OWCA metrics, metric objects are
+        created once per phase and bucket and updated in place
+        """
+        timer = self.timer
+        for phase, _ in timer.phases:
+            buckets, seconds = timer.histogram(phase)
+            metrics = self.cycle_slots.get(phase)
+            if metrics is None:
+                metrics = [OwcaMetric(name='prm_detect_phase_seconds_bucket',
+                                      value=0,
+                                      labels=dict(phase=phase, le=str(bound)))
+                           for bound, _ in buckets]
+                metrics.append(OwcaMetric(name='prm_detect_phase_seconds_sum',
+                                          value=0, labels=dict(phase=phase)))
+                metrics.append(OwcaMetric(
+                    name='prm_detect_phase_seconds_count', value=0,
+                    labels=dict(phase=phase)))
+                self.cycle_slots[phase] = metrics
+                self.cycle_metrics.extend(metrics)
+            for metric, (_, count) in zip(metrics, buckets):
+                metric.value = count
+            metrics[-2].value = seconds
+            metrics[-1].value = buckets[-1][1]
+        self.overrun_metric.value = timer.overruns
+        return self.cycle_metrics
 
     def detect(
             self,
@@ -222,6 +342,8 @@ class ContentionDetector(detectors.AnomalyDetector):
             tasks_measurements: TasksMeasurements,
             tasks_resources: TasksResources,
             tasks_labels: TasksLabels):
+        timer = self.timer
+        timer.start()
         log.debug('prm detect called...')
         log.debug('task_labels=%r', tasks_labels)
         assigned_cpus = 0
@@ -231,10 +353,11 @@ class ContentionDetector(detectors.AnomalyDetector):
             if self.mode_config == ContentionDetector.COLLECT_MODE:
                 app = self._cid_to_app(cid, tasks_labels)
                 if app:
-                    self.workload_meta[app] = resources
+                    self._set_workload_meta(app, resources)
 
         if self.mode_config == ContentionDetector.COLLECT_MODE:
             self._update_workload_meta()
+        timer.mark('resources')
 
         metric_list = []
         metric_list.extend(self._get_threshold_metrics())
@@ -250,8 +373,8 @@ class ContentionDetector(detectors.AnomalyDetector):
             log.debug('cid=%r container metrics=%r', cid, metrics)
             if metrics:
                 if not self._is_be_app(cid, tasks_labels):
-                    lcutil += metrics[Metric.UTIL]
-                sysutil += metrics[Metric.UTIL]
+                    lcutil += metrics.util
+                sysutil += metrics.util
                 owca_metrics = container.get_owca_metrics(app)
                 metric_list.extend(owca_metrics)
 
@@ -264,18 +387,21 @@ class ContentionDetector(detectors.AnomalyDetector):
                             app, name, metrics)
 
         self._remove_finished_tasks(cidset)
+        timer.mark('measurements')
 
         anomaly_list = []
         if self.mode_config == ContentionDetector.DETECT_MODE:
             metric_list.extend(self._get_headroom_metrics(
                 assigned_cpus, lcutil, sysutil))
-            for container in self.container_map.values():
-                app = self._cid_to_app(container.cid, tasks_labels)
-                if app:
-                    anomalies = self._detect_one_task(container, app)
-                    anomaly_list.extend(anomalies)
+            anomaly_list.extend(self._detect_tasks(tasks_labels))
+            timer.mark('detect')
         elif self.mode_config == ContentionDetector.COLLECT_MODE:
             self._record_utils(platform.timestamp, lcutil)
+            self.recorder.flush()
+            timer.mark('record')
+        if timer.finish():
+            log.debug('detect call overran action delay')
+        metric_list.extend(self._get_cycle_metrics())
         if anomaly_list:
             log.debug('anomalies: %r', anomaly_list)
         if metric_list:
@@ -0,0 +1,148 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" This module implements batched recording of data files in collect mode """
+
+import atexit
+import logging
+import time
+
+from prm.analyze.columnar import ColumnarWriter, FLOAT, STR, TIME
+
+log = logging.getLogger(__name__)
+
+
+class CsvWriter:
+    """
+    This class appends rows to csv data file through one open handle, rows
+    are buffered and written with one write when chunk size or chunk age is
+    reached
+    """
+    CHUNK_ROWS = 8192
+    CHUNK_AGE = 10
+
+    def __init__(self, path, columns, chunk_rows=CHUNK_ROWS,
+                 chunk_age=CHUNK_AGE):
+        """
+        Open csv data file, existing file with the same header is appended,
+        otherwise a new file is created
+            path - data file path
+            columns - list of column names
+            chunk_rows - max rows buffered before written
+            chunk_age - max seconds rows are buffered before written
+        """
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.chunk_age = chunk_age
+        self.lines = []
+        self.first_row_time = 0
+        headline = ','.join(columns) + '\n'
+        try:
+            with open(path, 'r') as dtf:
+                existing = dtf.readline()
+        except Exception:
+            log.debug('cannot open %r for reading - ignore', path)
+            existing = None
+        if existing == headline:
+            self.datf = open(path, 'a')
+        else:
+            self.datf = open(path, 'w')
+            self.datf.write(headline)
+            self.datf.flush()
+
+    def append(self, row):
+        """
+        Append one row, values are in header column order
+            row - list of column values
+        """
+        if not self.lines:
+            self.first_row_time = time.time()
+        self.lines.append(','.join(str(col) for col in row) + '\n')
+        if len(self.lines) >= self.chunk_rows:
+            self.flush(True)
+
+    def flush(self, force=False):
+        """
+        Write buffered rows if chunk age is reached
+            force - write buffered rows regardless of chunk age
+        """
+        if not self.lines:
+            return
+        if not force and time.time() - self.first_row_time < self.chunk_age:
+            return
+        self.datf.write(''.join(self.lines))
+        self.datf.flush()
+        self.lines = []
+
+    def close(self):
+        """ write buffered rows and close data file """
+        self.flush(True)
+        self.datf.close()
+
+
+class Recorder:
+    """
+    This class records rows of util and metric data files in collect mode,
+    rows of one detect call are buffered per file and each file is flushed
+    at most once per detect call by its size or age policy, buffered rows
+    are written at exit
+    """
+
+    def __init__(self):
+        self.files = dict()
+        atexit.register(self.close)
+
+    def add_file(self, path, columns, columnar=False):
+        """
+        Open data file for recording
+            path - data file path
+            columns - list of column names, first is time, next two are
+                      string columns, others are float columns
+            columnar - use columnar format instead of csv
+        """
+        if columnar:
+            types = [(col, STR) for col in columns[1:3]]
+            types.extend((col, FLOAT) for col in columns[3:])
+            self.files[path] = ColumnarWriter(path,
+                                              [(columns[0], TIME)] + types)
+        else:
+            self.files[path] = CsvWriter(path, columns)
+
+    def write(self, path, row):
+        """
+        Buffer one row of data file
+            path - data file path
+            row - list of column values
+        """
+        self.files[path].append(row)
+
+    def flush(self):
+        """ flush data files by their size or age policy """
+        for path, writer in self.files.items():
+            try:
+                writer.flush()
+            except (IOError, OSError, ValueError):
+                log.exception('cannot write %r', path)
+
+    def close(self):
+        """ write all buffered rows and close data files """
+        for path, writer in self.files.items():
+            try:
+                writer.close()
+            except (IOError, OSError, ValueError):
+                log.exception('cannot close %r', path)
+        self.files = dict()
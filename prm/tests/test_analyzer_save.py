@@ -0,0 +1,76 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Threshold model file persistence of Analyzer """
+
+import json
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from prm.analyze.analyzer import Analyzer  # noqa: E402
+
+
+def file_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.fixture
+def model_file(tmpdir):
+    path = str(tmpdir.join(Analyzer.THRESH_FILE))
+    with open(path, 'w') as threshf:
+        threshf.write(json.dumps({'lcutilmax': 100.0}))
+    return path
+
+
+@pytest.mark.parametrize('mode', [0o644, 0o640, 0o664])
+def test_save_keeps_mode(model_file, mode):
+    os.chmod(model_file, mode)
+    analyzer = Analyzer(thresh_file=model_file)
+    analyzer.threshold['lcutilmax'] = 200.0
+    analyzer.save()
+
+    assert file_mode(model_file) == mode
+    with open(model_file) as threshf:
+        assert json.loads(threshf.read())['lcutilmax'] == 200.0
+
+
+def test_save_async_keeps_mode(model_file):
+    os.chmod(model_file, 0o644)
+    analyzer = Analyzer(thresh_file=model_file)
+    analyzer.update_lcutilmax(300.0)
+    analyzer.saver.close()
+
+    assert file_mode(model_file) == 0o644
+    with open(model_file) as threshf:
+        assert json.loads(threshf.read())['lcutilmax'] == 300.0
+
+
+def test_save_new_file_follows_umask(tmpdir):
+    path = str(tmpdir.join(Analyzer.THRESH_FILE))
+    umask = os.umask(0o027)
+    try:
+        Analyzer(thresh_file=path).save()
+    finally:
+        os.umask(umask)
+
+    assert file_mode(path) == 0o640
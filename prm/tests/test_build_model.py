@@ -0,0 +1,134 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Threshold model build from recorded data """
+
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from prm.analyze.analyzer import Analyzer, Metric  # noqa: E402
+
+WORKLOADS = {'cassandra': 2, 'django': 1}
+METRIC_COLUMNS = ['time', 'cid', 'name', Metric.UTIL, Metric.NF, Metric.CPI,
+                  Metric.L3MPKI, Metric.MBL, Metric.MBR, Metric.L2SPKI,
+                  Metric.MSPKI]
+
+
+def write_data(path, seed=0, rows=300):
+    rand = np.random.RandomState(seed)
+    with open(str(path.join(Analyzer.METRIC_FILE)), 'w') as metricf:
+        metricf.write(','.join(METRIC_COLUMNS) + '\n')
+        for step in range(rows):
+            for name, cpus in sorted(WORKLOADS.items()):
+                util = rand.uniform(cpus * 50, (cpus + 1) * 100)
+                values = [util, rand.normal(2000, 50), rand.normal(1.0, 0.1),
+                          rand.normal(2.0, 0.3), rand.normal(800, 100),
+                          rand.normal(200, 30), rand.normal(10, 2),
+                          rand.normal(5, 1)]
+                metricf.write('%d,%s,%s,' % (step, name, name) +
+                              ','.join('%.6f' % v for v in values) + '\n')
+    with open(str(path.join(Analyzer.UTIL_FILE)), 'w') as utilf:
+        utilf.write('time,cid,name,%s\n' % Metric.UTIL.value)
+        for step in range(rows):
+            utilf.write('%d,,lcs,%.6f\n' % (step, rand.uniform(100, 400)))
+
+
+def rewrite_workload(path, name, seed):
+    # replace recorded rows of one workload, rows of others are kept
+    rand = np.random.RandomState(seed)
+    metric_file = str(path.join(Analyzer.METRIC_FILE))
+    with open(metric_file) as metricf:
+        lines = metricf.readlines()
+    for index, line in enumerate(lines):
+        fields = line.split(',')
+        if fields[2] == name:
+            fields[5] = '%.6f' % rand.normal(1.5, 0.1)
+            lines[index] = ','.join(fields)
+    with open(metric_file, 'w') as metricf:
+        metricf.writelines(lines)
+
+
+def build(path, name, **kwargs):
+    wl_file = str(path.join('workload.json'))
+    with open(wl_file, 'w') as wlf:
+        wlf.write(json.dumps({job: {'cpus': cpus}
+                              for job, cpus in WORKLOADS.items()}))
+    thresh_file = str(path.join(name))
+    analyzer = Analyzer(open(wl_file), thresh_file)
+    analyzer.build_model(str(path.join(Analyzer.UTIL_FILE)),
+                         str(path.join(Analyzer.METRIC_FILE)), **kwargs)
+    with open(thresh_file) as threshf:
+        return threshf.read()
+
+
+@pytest.fixture(scope='module')
+def data_dir(tmpdir_factory):
+    path = tmpdir_factory.mktemp('data')
+    write_data(path)
+    return path
+
+
+@pytest.fixture(scope='module')
+def serial_model(data_dir):
+    model = build(data_dir, 'serial.json')
+    threshold = json.loads(model)
+    assert set(threshold) == set(WORKLOADS) | {'lcutilmax'}
+    for job in WORKLOADS:
+        assert threshold[job]['thresh'] and threshold[job]['tdp']
+    return model
+
+
+def test_parallel_build_identical(data_dir, serial_model):
+    assert build(data_dir, 'parallel.json', jobs=3) == serial_model
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_chunked_build_identical(data_dir, serial_model, jobs):
+    assert build(data_dir, 'chunked-%d.json' % jobs, chunk_rows=100,
+                 jobs=jobs) == serial_model
+
+
+def test_incremental_build_refits_changed_workloads(tmpdir, monkeypatch):
+    write_data(tmpdir, rows=200)
+    fitted = []
+    fit_plans = Analyzer._fit_plans
+
+    def record_fit(self, plans, *args, **kwargs):
+        fitted.extend(job for job, _ in plans)
+        return fit_plans(self, plans, *args, **kwargs)
+
+    monkeypatch.setattr(Analyzer, '_fit_plans', record_fit)
+    first = json.loads(build(tmpdir, 'model.json'))
+    assert sorted(fitted) == sorted(WORKLOADS)
+
+    del fitted[:]
+    assert json.loads(build(tmpdir, 'model.json', incremental=True)) == first
+    assert fitted == []
+
+    rewrite_workload(tmpdir, 'django', 1)
+    second = json.loads(build(tmpdir, 'model.json', incremental=True))
+    assert fitted == ['django']
+    assert second['cassandra'] == first['cassandra']
+    assert second['django']['fingerprint'] != first['django']['fingerprint']
+    assert second['django']['thresh'] != first['django']['thresh']
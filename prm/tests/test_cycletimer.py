@@ -0,0 +1,76 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Per phase latency measurement of monitor cycles """
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from prm.analyze import cycletimer  # noqa: E402
+from prm.analyze.cycletimer import CycleTimer, TOTAL  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cycletimer, '_clock', lambda: now[0])
+    return now
+
+
+def run_cycle(timer, clock, phases):
+    timer.start()
+    for phase, seconds in phases:
+        clock[0] += seconds
+        timer.mark(phase)
+    return timer.finish()
+
+
+def test_histogram(clock):
+    timer = CycleTimer('metric', buckets=(0.125, 1.0))
+    run_cycle(timer, clock, [('parse', 0.0625), ('detect', 0.5)])
+    run_cycle(timer, clock, [('parse', 0.125), ('detect', 2.0)])
+
+    assert [phase for phase, _ in timer.phases] == ['parse', 'detect', TOTAL]
+    assert timer.phases[1][1] == pytest.approx(2.0)
+    buckets, total = timer.histogram('parse')
+    assert buckets == [(0.125, 2), (1.0, 2), ('+Inf', 2)]
+    assert total == pytest.approx(0.1875)
+    buckets, total = timer.histogram('detect')
+    assert buckets == [(0.125, 0), (1.0, 1), ('+Inf', 2)]
+    assert total == pytest.approx(2.5)
+    buckets, total = timer.histogram(TOTAL)
+    assert buckets == [(0.125, 0), (1.0, 1), ('+Inf', 2)]
+    assert total == pytest.approx(2.6875)
+    assert timer.histogram('unknown') == ([(0.125, 0), (1.0, 0), ('+Inf', 0)],
+                                          0.0)
+
+
+def test_overrun(clock):
+    timer = CycleTimer('metric', interval=1)
+    assert not run_cycle(timer, clock, [('detect', 0.5)])
+    assert run_cycle(timer, clock, [('detect', 1.5)])
+    assert not run_cycle(timer, clock, [('detect', 1.0)])
+    assert timer.overruns == 1
+
+    timer = CycleTimer('util')
+    assert not run_cycle(timer, clock, [('detect', 100.0)])
+    assert timer.overruns == 0
@@ -0,0 +1,123 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Vectorized fleet detection against per container scalar rules """
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from prm.analyze.detection import FleetDetector  # noqa: E402
+from prm.analyze.threshtable import ThresholdTable  # noqa: E402
+
+NAN = float('nan')
+
+
+def scalar_bin(threshs, util):
+    # bin lookup of per container detection in model file format
+    for i, thresh in enumerate(threshs):
+        if util < thresh['util_start']:
+            return threshs[i - 1] if i else None
+        if util < thresh['util_end'] or i == len(threshs) - 1:
+            return thresh
+    return None
+
+
+def scalar_verdict(threshs, tdp, util, cpi, mpki, mb, nf, mspki):
+    verdict = set()
+    thresh = scalar_bin(threshs, util) if threshs else None
+    if thresh is not None and cpi > thresh.get('cpi', NAN):
+        if mpki > thresh.get('mpki', NAN):
+            verdict.add('llc')
+        if mb < thresh.get('mb', NAN) or mspki > thresh.get('mspki', NAN):
+            verdict.add('mem_bw')
+        if not verdict:
+            verdict.add('unkn')
+    if tdp and util >= tdp['util'] and nf < tdp['bar']:
+        verdict.add('tdp')
+    return verdict
+
+
+def random_model(rand):
+    threshs = []
+    start = rand.choice([50.0, 100.0])
+    for _ in range(rand.randint(1, 5)):
+        # gaps between bins are kept, utilization in a gap falls into the
+        # bin below it
+        end = start + 50.0
+        thresh = {'util_start': start, 'util_end': end}
+        for key, mean in (('cpi', 1.0), ('mpki', 2.0), ('mb', 1000.0),
+                          ('mspki', 5.0)):
+            if rand.rand() < 0.8:
+                thresh[key] = rand.normal(mean, mean / 4)
+            elif rand.rand() < 0.5:
+                thresh[key] = NAN
+        threshs.append(thresh)
+        start = end + rand.choice([0.0, 0.0, 25.0])
+    tdp = {}
+    if rand.rand() < 0.7:
+        tdp = {'util': rand.choice([90.0, 150.0, 190.0]),
+               'bar': rand.normal(0.9, 0.05)}
+    return threshs, tdp
+
+
+def random_util(rand, threshs):
+    edges = [t['util_start'] for t in threshs] +\
+        [t['util_end'] for t in threshs]
+    if rand.rand() < 0.4:
+        return float(rand.choice(edges))
+    return rand.uniform(0.0, max(edges) + 100.0)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_fleet_matches_scalar_rules(seed):
+    rand = np.random.RandomState(seed)
+    models = [random_model(rand) for _ in range(8)]
+    tables = [ThresholdTable(threshs) for threshs, _ in models]
+    fleet = FleetDetector(capacity=16)
+    rows = []
+    for _ in range(500):
+        index = rand.randint(len(models) + 1)
+        if index == len(models):
+            threshs, tdp, table = [], {}, None
+        else:
+            (threshs, tdp), table = models[index], tables[index]
+        util = random_util(rand, threshs or [{'util_start': 50.0,
+                                              'util_end': 100.0}])
+        if tdp and rand.rand() < 0.2:
+            util = tdp['util']
+        values = (util, rand.normal(1.0, 0.3), rand.normal(2.0, 0.6),
+                  rand.normal(1000.0, 300.0), rand.normal(0.9, 0.05),
+                  rand.normal(5.0, 1.5) if rand.rand() < 0.7 else NAN)
+        fleet.add(table, tdp, *values)
+        rows.append((threshs, tdp, values))
+
+    result = fleet.detect()
+    for row, (threshs, tdp, values) in enumerate(rows):
+        verdict = set(name for name in ('llc', 'mem_bw', 'unkn', 'tdp')
+                      if getattr(result, name)[row])
+        assert verdict == scalar_verdict(threshs, tdp, *values), row
+        thresh = scalar_bin(threshs, values[0]) if threshs else None
+        if thresh is None:
+            assert result.bins[row] == -1
+        else:
+            assert threshs[result.bins[row]] is thresh
@@ -0,0 +1,134 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Online threshold model update bounded by offline model """
+
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from prm.analyze.analyzer import Analyzer  # noqa: E402
+from prm.analyze.online import OnlineModel  # noqa: E402
+from prm.analyze.record import MetricRecord  # noqa: E402
+
+OFFLINE_BIN = {'util_start': 100.0, 'util_end': 150.0, 'cpi': 1.0,
+               'mpki': 2.0, 'mb': 1000.0}
+OFFLINE_TDP = {'util': 95.0, 'mean': 0.9, 'std': 0.01, 'bar': 0.87}
+
+
+@pytest.fixture
+def analyzer(tmpdir):
+    path = str(tmpdir.join(Analyzer.THRESH_FILE))
+    with open(path, 'w') as threshf:
+        threshf.write(json.dumps({'job': {'tdp': dict(OFFLINE_TDP),
+                                          'thresh': [dict(OFFLINE_BIN)]}}))
+    analyzer = Analyzer(thresh_file=path)
+    analyzer.workload_meta = {'job': {'cpus': 1}}
+    return analyzer
+
+
+def record(cpi, mpki, memb, freq):
+    metrics = MetricRecord()
+    metrics.cpi = cpi
+    metrics.l3mpki = mpki
+    metrics.mb = memb
+    metrics.nf = freq
+    return metrics
+
+
+def test_refit_tightens_at_most_max_drift(analyzer):
+    online = OnlineModel(analyzer, min_samples=50, refresh_samples=50)
+    rand = np.random.RandomState(0)
+    for _ in range(200):
+        online.add('job', 120.0, record(rand.normal(0.5, 0.01),
+                                        rand.normal(1.0, 0.01),
+                                        rand.normal(3000.0, 10.0), 0.9))
+
+    assert online.refresh() == ['job']
+    thresh = analyzer.get_thresh('job')[0]
+    assert thresh['cpi'] == pytest.approx(OFFLINE_BIN['cpi'] * 0.9)
+    assert thresh['mpki'] == pytest.approx(OFFLINE_BIN['mpki'] * 0.9)
+    assert thresh['mb'] == pytest.approx(OFFLINE_BIN['mb'] * 1.1)
+
+
+def test_refit_loosens_at_most_max_drift(analyzer):
+    online = OnlineModel(analyzer, min_samples=50, refresh_samples=50)
+    rand = np.random.RandomState(0)
+    for _ in range(200):
+        online.add('job', 120.0, record(rand.normal(2.0, 0.01),
+                                        rand.normal(4.0, 0.01),
+                                        rand.normal(500.0, 10.0), 0.9))
+
+    online.refresh()
+    thresh = analyzer.get_thresh('job')[0]
+    assert thresh['cpi'] == pytest.approx(OFFLINE_BIN['cpi'] * 1.1)
+    assert thresh['mpki'] == pytest.approx(OFFLINE_BIN['mpki'] * 1.1)
+    assert thresh['mb'] == pytest.approx(OFFLINE_BIN['mb'] * 0.9)
+
+
+def test_bins_without_offline_fense_untouched(analyzer):
+    online = OnlineModel(analyzer, min_samples=50, refresh_samples=50)
+    for _ in range(100):
+        online.add('job', 60.0, record(0.5, 1.0, 3000.0, 0.9))
+        online.add('other', 120.0, record(0.5, 1.0, 3000.0, 0.9))
+
+    assert online.refresh() == []
+    assert analyzer.get_thresh('job') == [OFFLINE_BIN]
+    assert analyzer.get_thresh('other') == {}
+
+
+def test_model_file_kept(analyzer):
+    with open(analyzer.thresh_file) as threshf:
+        model = threshf.read()
+    rand = np.random.RandomState(0)
+    for _ in range(2):
+        online = OnlineModel(analyzer, min_samples=50, refresh_samples=50)
+        for _ in range(200):
+            online.add('job', 120.0, record(rand.normal(0.5, 0.01),
+                                            rand.normal(1.0, 0.01),
+                                            rand.normal(3000.0, 10.0), 0.9))
+        online.refresh()
+        # restart from model file, drift must not compound
+        analyzer = Analyzer(thresh_file=analyzer.thresh_file)
+        analyzer.workload_meta = {'job': {'cpus': 1}}
+
+    with open(analyzer.thresh_file) as threshf:
+        assert threshf.read() == model
+    with open(analyzer.online_file) as onlinef:
+        thresh = json.loads(onlinef.read())['job']['thresh'][0]
+    assert thresh['cpi'] == pytest.approx(OFFLINE_BIN['cpi'] * 0.9)
+    assert analyzer.get_thresh('job') == [OFFLINE_BIN]
+
+
+def test_tdp_seeded_from_offline_model(analyzer):
+    online = OnlineModel(analyzer, min_samples=100, refresh_samples=50)
+    for _ in range(50):
+        online.add('job', 120.0, record(1.0, 2.0, 1000.0, 0.8))
+
+    online.refresh()
+    tdp = analyzer.get_tdp_thresh('job')
+    assert tdp['util'] == OFFLINE_TDP['util']
+    assert 0.8 < tdp['mean'] < OFFLINE_TDP['mean']
+    assert tdp['std'] > OFFLINE_TDP['std']
+    assert tdp['bar'] == pytest.approx(OFFLINE_TDP['bar'] * 0.9)
+    assert analyzer.get_tdp_thresh('job', offline=True) == OFFLINE_TDP
@@ -0,0 +1,77 @@
+# Copyright (C) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+#
+# SPDX-License-Identifier: Apache-2.0
+
+""" Batched recording of data files in collect mode """
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from prm import recorder  # noqa: E402
+from prm.recorder import CsvWriter, Recorder  # noqa: E402
+
+COLUMNS = ['time', 'cid', 'name', 'value']
+
+
+def read_lines(path):
+    with open(path) as datf:
+        return datf.read().splitlines()
+
+
+def test_flush_on_chunk_size(tmpdir):
+    path = str(tmpdir.join('metric.csv'))
+    writer = CsvWriter(path, COLUMNS, chunk_rows=2, chunk_age=3600)
+    writer.append([0, 'a', 'x', 1.0])
+    writer.flush()
+    assert read_lines(path) == ['time,cid,name,value']
+    writer.append([1, 'a', 'x', 2.0])
+    assert read_lines(path)[1:] == ['0,a,x,1.0', '1,a,x,2.0']
+    writer.close()
+
+
+def test_flush_on_chunk_age(tmpdir, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(recorder.time, 'time', lambda: now[0])
+    path = str(tmpdir.join('metric.csv'))
+    rec = Recorder()
+    rec.add_file(path, COLUMNS)
+    rec.write(path, [0, 'a', 'x', 1.0])
+    now[0] += CsvWriter.CHUNK_AGE - 1
+    rec.flush()
+    assert read_lines(path)[1:] == []
+    now[0] += 1
+    rec.flush()
+    assert read_lines(path)[1:] == ['0,a,x,1.0']
+    rec.close()
+
+
+def test_existing_file_appended(tmpdir):
+    path = str(tmpdir.join('metric.csv'))
+    rec = Recorder()
+    rec.add_file(path, COLUMNS)
+    rec.write(path, [0, 'a', 'x', 1.0])
+    rec.close()
+    assert read_lines(path)[1:] == ['0,a,x,1.0']
+
+    rec = Recorder()
+    rec.add_file(path, COLUMNS)
+    rec.write(path, [1, 'a', 'x', 2.0])
+    rec.close()
+    assert read_lines(path) == ['time,cid,name,value', '0,a,x,1.0',
+                                '1,a,x,2.0']